@@ -9,12 +9,23 @@ module.exports = {
         NODE_ENV: "production"
       }
     },
+    // Whisperモデルを常駐させる場合（whisper_transcriber/.env の INFERENCE_SOCKET も設定する）
+    // {
+    //   name: "WhisperInferenceDaemon",
+    //   cwd: "./whisper_transcriber",
+    //   script: "./venv/bin/python",
+    //   args: "inference_daemon.py",
+    //   interpreter: "none",
+    //   kill_timeout: 10000
+    // },
     {
       name: "WhisperTranscriber",
       cwd: "./whisper_transcriber",
       script: "./venv/bin/python",
       args: "transcriber.py",
-      interpreter: "none"
+      interpreter: "none",
+      // 停止時はキューに残っている録音直後のファイルを処理し終えてから終了する
+      kill_timeout: 120000
     },
     {
       name: "KotonariTranscripts",
@@ -0,0 +1,148 @@
+"""
+分類結果のキャッシュ
+会議の文字起こしには「よろしくお願いします」「以上です」のような同じ短い文が繰り返し現れるため、
+一度分類した文の結果（ラベルとスコア）を保持し、モデルでの分類を省きます。
+
+キーは正規化した文・候補ラベル・仮説テンプレート・モデル名（とバックエンド・スコアリング）の組なので、
+ラベルやモデルを変更した場合は古い結果が使われることはありません。
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import unicodedata
+from pathlib import Path
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_sentence(sentence):
+    """キャッシュのキーに使うように文を正規化（全角・半角の統一、空白の除去）"""
+    return "".join(unicodedata.normalize("NFKC", sentence).split())
+
+
+class ClassificationCache:
+    """最近使った順に最大 max_entries 件の分類結果を保持するLRUキャッシュ"""
+
+    def __init__(self, max_entries=10000, path=None, save_interval=60.0):
+        """
+        Args:
+            max_entries: 保持する最大件数（超えた分は最も長く使われていないものから削除）
+            path: 保存先のJSONファイルのパス（Noneでメモリ上にだけ保持）
+            save_interval: 保存する最小間隔（秒）。抽出のたびにファイル全体を書き直さないようにする
+        """
+        self.max_entries = max_entries
+        self.path = Path(path) if path else None
+        self.save_interval = save_interval
+        self.last_saved = time.time()
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()  # 保存を1つずつ行う（一時ファイルへの書き込みが混ざらないようにする）
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.path and self.path.exists():
+            self._load()
+
+    @staticmethod
+    def make_key(sentence, labels, hypothesis_template, model_name, scoring=None, backend=None):
+        """
+        キャッシュのキー
+
+        Args:
+            scoring: デフォルト以外のスコアリングの場合に指定する
+            backend: 推論のバックエンド（torch と onnx のint8ではスコアが異なるため区別する）
+        """
+        key = [normalize_sentence(sentence), list(labels), hypothesis_template, model_name]
+        if scoring:
+            key.append(scoring)
+        if backend:
+            key.append(f"backend={backend}")
+        return json.dumps(key, ensure_ascii=False)
+
+    def get(self, key):
+        """
+        分類結果を取得
+
+        Returns:
+            (ラベル, スコア)。キャッシュにない場合はNone
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[0]), list(entry[1])
+
+    def put(self, key, labels, scores):
+        """分類結果を追加"""
+        with self.lock:
+            self.entries[key] = (list(labels), [float(score) for score in scores])
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.dirty = True
+
+    def stats(self):
+        """ヒット率などの統計"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def _load(self):
+        """保存したキャッシュを読み込む（壊れている場合は空から始める）"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"分類キャッシュを読み込めませんでした: {e}")
+            return
+
+        # 古いものから順に保存しているので、上限を超える分は古いものを捨てる
+        for key, labels, scores in records[-self.max_entries:]:
+            self.entries[key] = (labels, scores)
+        logger.info(f"分類キャッシュを読み込みました: {len(self.entries)}件")
+
+    def save(self, force=False):
+        """
+        キャッシュをファイルに保存（一時ファイルに書いてから置き換える）
+
+        Args:
+            force: 前回の保存から save_interval 秒たっていなくても保存する（終了時）。
+                   どちらの場合も、変更がなければ何もしない
+        """
+        if self.path is None:
+            return
+        # 書き込み中は get/put を待たせないよう、保存だけを save_lock で1つずつ行う
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty or (not force and time.time() - self.last_saved < self.save_interval):
+                    return
+                records = [[key, labels, scores] for key, (labels, scores) in self.entries.items()]
+                self.dirty = False
+                self.last_saved = time.time()
+
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(records, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"分類キャッシュを保存できませんでした: {e}")
+                with self.lock:
+                    self.dirty = True  # 次の機会に保存し直す
@@ -16,6 +16,7 @@ from watchdog.observers import Observer                 # OSネイティブの
 from watchdog.events import FileSystemEventHandler      # ファイルシステム上のイベント処理を行うための基底クラス
 
 from task_extractor import TaskExtractor    # 自然言語推論を行うファイル
+from classification_cache import ClassificationCache    # 分類結果のキャッシュ
 from line_notifier import LineNotifier      # LINE の Messaging API 関連 
 
 # 環境変数の読み込み
@@ -36,6 +37,54 @@ logger = logging.getLogger(__name__)
 TEXT_DIR = Path("./text")
 PROCESSED_FILES = set()  # 処理済みファイルを記録 => 集合を作る。（重複データは増やさない。）
 
+# アイドル時のモデル解放設定
+# MODEL_IDLE_UNLOAD_SEC: 分類がこの秒数行われなかったらモデルを解放する（0で常に保持）
+# AUDIO_WATCH_DIR: 新しい録音ファイルの作成を検出したら、解放したモデルを読み込んでおく
+MODEL_IDLE_UNLOAD_SEC = float(os.getenv("MODEL_IDLE_UNLOAD_SEC", "0"))
+AUDIO_WATCH_DIR = Path(os.getenv("AUDIO_WATCH_DIR", "../KotoLab01/recordings"))
+
+# CLASSIFY_BATCH_SIZE: まとめて推論する（文, ラベル）のペア数（1で1文ずつ分類）
+# CLASSIFY_BATCH_FILES: 起動時の未処理ファイルをまとめて分類するファイル数（分類できた分から通知する）
+CLASSIFY_BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", "32"))
+CLASSIFY_BATCH_FILES = max(1, int(os.getenv("CLASSIFY_BATCH_FILES", "10")))
+# CLASSIFY_CASCADE: ルールで判定できる文（明確な依頼表現・挨拶など）はモデルを使わずに判定する
+CLASSIFY_CASCADE = os.getenv("CLASSIFY_CASCADE", "false").lower() == "true"
+
+# 分類結果のキャッシュ設定
+# CLASSIFY_CACHE_SIZE: 保持する分類結果の最大件数（0でキャッシュしない）
+# CLASSIFY_CACHE_PATH: キャッシュの保存先（空でメモリ上にだけ保持し、再起動で消える）
+CLASSIFY_CACHE_SIZE = int(os.getenv("CLASSIFY_CACHE_SIZE", "10000"))
+CLASSIFY_CACHE_PATH = os.getenv("CLASSIFY_CACHE_PATH", "./model_cache/classification_cache.json")
+
+# 推論バックエンド設定
+# CLASSIFIER_BACKEND: torch（デフォルト）または onnx（int8に量子化したモデルをONNX Runtimeで推論）
+# CLASSIFIER_ONNX_DIR: onnx の量子化モデルの保存先（初回に変換して保存する）
+# CLASSIFIER_THREADS: onnx の推論のスレッド数（0で自動）
+CLASSIFIER_BACKEND = os.getenv("CLASSIFIER_BACKEND", "torch").lower()
+CLASSIFIER_ONNX_DIR = os.getenv("CLASSIFIER_ONNX_DIR", "./model_cache/onnx")
+CLASSIFIER_THREADS = int(os.getenv("CLASSIFIER_THREADS", "0"))
+# CLASSIFY_SCORING: single_label（すべての候補ラベルを比べる）または
+#                   early_stop（タスクらしくない文を1つの仮説で打ち切り、残りの文だけをラベルごとに調べる）
+# CLASSIFY_GATE_THRESHOLD: early_stop でタスクらしくないと判定する確率（これ未満で打ち切る）
+# CLASSIFY_EARLY_STOP_CONFIDENCE: early_stop でタスクと判定する確率の下限
+CLASSIFY_SCORING = os.getenv("CLASSIFY_SCORING", "single_label").lower()
+CLASSIFY_GATE_THRESHOLD = float(os.getenv("CLASSIFY_GATE_THRESHOLD", "0.3"))
+CLASSIFY_EARLY_STOP_CONFIDENCE = float(os.getenv("CLASSIFY_EARLY_STOP_CONFIDENCE", "0.5"))
+
+
+class AudioActivityHandler(FileSystemEventHandler):
+    """録音ファイルの作成（= 文字起こし結果が届く前触れ）を監視するハンドラー"""
+    
+    def __init__(self, task_extractor):
+        self.task_extractor = task_extractor
+        super().__init__()
+    
+    def on_created(self, event):
+        """録音が始まったらモデルを読み込んでおく"""
+        if event.is_directory or Path(event.src_path).suffix.lower() != '.wav':
+            return
+        self.task_extractor.prewarm()
+
 
 class TextFileHandler(FileSystemEventHandler):
     """テキストファイルの変更を監視するハンドラー"""
@@ -82,38 +131,73 @@ class TextFileHandler(FileSystemEventHandler):
         
         logger.info(f"ファイルの変更を検出: {file_path.name}")
         self.process_file(file_path)
-    
+
+    def on_moved(self, event):
+        """ファイルが名前変更された時の処理（途中経過ファイル .txt.partial からの置き換えで確定したテキスト）"""
+        if event.is_directory:
+            return
+
+        file_path = Path(event.dest_path)
+
+        # .txtファイルのみ処理
+        if file_path.suffix != '.txt':
+            return
+
+        logger.info(f"新しいファイルを検出: {file_path.name}")
+        self.process_file(file_path)
+
     def process_file(self, file_path):
         """ファイルを処理してLINE通知を送信"""
-        try:
-            # ファイル内容を読み込む
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+        self.process_files([file_path])
+    
+    def process_files(self, file_paths):
+        """複数のファイルのタスクをまとめて抽出し、ファイルごとにLINE通知を送信"""
+        documents = []
+        for file_path in file_paths:
+            try:
+                # ファイル内容を読み込む
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except Exception as e:
+                logger.error(f"ファイル処理エラー: {e}", exc_info=True)
+                continue
             
             if not content.strip():
                 logger.warning(f"空のファイル: {file_path.name}")
-                return
-            
+                continue
+            documents.append((file_path, content))
+        
+        if not documents:
+            return
+        
+        try:
             # タスク抽出
-            logger.info(f"タスクを抽出中: {file_path.name}")
-            tasks = self.task_extractor.extract_tasks(content, file_path.name)
-            
-            # LINE通知を送信
-            logger.info(f"LINE通知を送信中: タスク数 {len(tasks)}")
-            success = self.line_notifier.send_notification(
-                tasks=tasks,
-                full_text=content,
-                file_name=file_path.name
+            logger.info(f"タスクを抽出中: {', '.join(file_path.name for file_path, _ in documents)}")
+            all_tasks = self.task_extractor.extract_tasks_batch(
+                [(content, file_path.name) for file_path, content in documents]
             )
-            
-            if success:
-                logger.info("LINE通知を送信しました")
-                PROCESSED_FILES.add(file_path.name)
-            else:
-                logger.error("LINE通知の送信に失敗しました")
-                
         except Exception as e:
             logger.error(f"ファイル処理エラー: {e}", exc_info=True)
+            return
+        
+        for (file_path, content), tasks in zip(documents, all_tasks):
+            try:
+                # LINE通知を送信
+                logger.info(f"LINE通知を送信中: タスク数 {len(tasks)}")
+                success = self.line_notifier.send_notification(
+                    tasks=tasks,
+                    full_text=content,
+                    file_name=file_path.name
+                )
+                
+                if success:
+                    logger.info("LINE通知を送信しました")
+                    PROCESSED_FILES.add(file_path.name)
+                else:
+                    logger.error("LINE通知の送信に失敗しました")
+                    
+            except Exception as e:
+                logger.error(f"ファイル処理エラー: {e}", exc_info=True)
 
 
 def main():
@@ -140,9 +224,23 @@ def main():
         logger.info(f"{TEXT_DIR}ディレクトリを作成しました")
     
     # 各コンポーネントの初期化
+    cache = None
     try:
         logger.info("タスク抽出器を初期化中...")
-        task_extractor = TaskExtractor()
+        if CLASSIFY_CACHE_SIZE > 0:
+            cache = ClassificationCache(CLASSIFY_CACHE_SIZE, CLASSIFY_CACHE_PATH or None)
+        task_extractor = TaskExtractor(
+            idle_unload_sec=MODEL_IDLE_UNLOAD_SEC,
+            batch_size=CLASSIFY_BATCH_SIZE,
+            cascade=CLASSIFY_CASCADE,
+            cache=cache,
+            backend=CLASSIFIER_BACKEND,
+            onnx_cache_dir=CLASSIFIER_ONNX_DIR or None,
+            threads=CLASSIFIER_THREADS,
+            scoring=CLASSIFY_SCORING,
+            gate_threshold=CLASSIFY_GATE_THRESHOLD,
+            early_stop_confidence=CLASSIFY_EARLY_STOP_CONFIDENCE
+        )
         
         logger.info("LINE通知システムを初期化中...")
         line_notifier = LineNotifier(
@@ -155,6 +253,11 @@ def main():
         observer = Observer()
         observer.schedule(event_handler, str(TEXT_DIR), recursive=False)
         
+        # モデルを解放する場合は録音の開始を検出して事前に読み込む
+        if MODEL_IDLE_UNLOAD_SEC > 0 and AUDIO_WATCH_DIR.exists():
+            observer.schedule(AudioActivityHandler(task_extractor), str(AUDIO_WATCH_DIR), recursive=False)
+            logger.info(f"録音ディレクトリを監視します（モデルの事前読み込み）: {AUDIO_WATCH_DIR}")
+        
         # 監視開始
         observer.start()
         logger.info(f"ファイル監視を開始しました: {TEXT_DIR}")
@@ -164,19 +267,26 @@ def main():
         existing_files = list(TEXT_DIR.glob("*.txt"))
         if existing_files:
             logger.info(f"既存のファイルが{len(existing_files)}個見つかりました")
-            for file_path in existing_files:
-                if file_path.name not in PROCESSED_FILES:
-                    logger.info(f"既存ファイルを処理: {file_path.name}")
-                    event_handler.process_file(file_path)
+            pending_files = [file_path for file_path in existing_files if file_path.name not in PROCESSED_FILES]
+            # 未処理のファイルの文は CLASSIFY_BATCH_FILES 個ずつまとめて分類する
+            # （すべての分類が終わるまで通知を待たせず、エラーの影響もそのまとまりだけにとどめる）
+            logger.info(f"既存ファイルを処理: {len(pending_files)}個")
+            for start in range(0, len(pending_files), CLASSIFY_BATCH_FILES):
+                event_handler.process_files(pending_files[start:start + CLASSIFY_BATCH_FILES])
         
         # 監視を継続
         while True:
             time.sleep(1)
+            # 分類キャッシュの変更は一定間隔でまとめて保存する
+            if cache is not None:
+                cache.save()
             
     except KeyboardInterrupt:
         logger.info("終了シグナルを受信しました")
         observer.stop()
         observer.join()
+        if cache is not None:
+            cache.save(force=True)
         logger.info("Kotonari を終了しました")
         
     except Exception as e:
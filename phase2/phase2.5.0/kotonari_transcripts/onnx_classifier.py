@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+ONNX Runtimeによるゼロショット分類（int8動的量子化）
+NLIモデルを一度だけONNXに変換してint8に動的量子化し、ディスクにキャッシュします（CPU専用）。
+transformers の zero-shot-classification パイプラインと同じ形式の結果を返します。
+
+onnxruntime が必要です: pip install onnxruntime
+
+変換だけを行う:
+    python onnx_classifier.py export
+
+PyTorchのモデルとの分類結果の比較:
+    python onnx_classifier.py compare text/meeting1.txt text/meeting2.txt
+
+early_stop と single_label のスコアリングの判定の比較（閾値の調整に使う）:
+    python onnx_classifier.py scoring --backend onnx --gate-threshold 0.3 text/meeting1.txt
+"""
+
+import sys
+import time
+import shutil
+import logging
+import argparse
+from pathlib import Path
+
+import numpy as np
+import torch
+from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / 'model_cache' / 'onnx'
+
+_INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+
+
+def cache_path(model_name, cache_dir=DEFAULT_CACHE_DIR):
+    """量子化モデル（ONNX・トークナイザー・設定）の保存ディレクトリ"""
+    return Path(cache_dir) / f"{model_name.replace('/', '--')}-int8"
+
+
+def export_quantized_model(model_name, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    モデルをONNXに変換してint8に動的量子化し、保存する
+
+    Args:
+        model_name: Hugging Faceのモデル名
+        cache_dir: 保存先のディレクトリ
+
+    Returns:
+        保存したディレクトリのパス
+    """
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise ImportError("onnxruntimeがインストールされていません: pip install onnxruntime") from e
+
+    path = cache_path(model_name, cache_dir)
+    tmp_path = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    logger.info(f"モデルをONNXに変換中: {model_name}")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["資料を明日までに送ってください"], ["この文は依頼です。"], return_tensors="pt")
+    input_names = [name for name in _INPUT_NAMES if name in sample]
+    fp32_path = tmp_path / "model-fp32.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in input_names}, "logits": {0: "batch"}},
+            opset_version=14
+        )
+
+    logger.info("ONNXモデルをint8に量子化中...")
+    quantize_dynamic(str(fp32_path), str(tmp_path / "model.onnx"), weight_type=QuantType.QInt8)
+    fp32_path.unlink()
+
+    tokenizer.save_pretrained(tmp_path)
+    model.config.save_pretrained(tmp_path)
+
+    shutil.rmtree(path, ignore_errors=True)
+    tmp_path.replace(path)
+    logger.info(f"量子化モデルを保存しました: {path}")
+    return path
+
+
+class OnnxZeroShotClassifier:
+    """ONNX Runtimeで推論するゼロショット分類器（zero-shot-classification パイプラインと同じ呼び出し方）"""
+
+    def __init__(self, model_name, cache_dir=DEFAULT_CACHE_DIR, threads=0):
+        """
+        Args:
+            model_name: Hugging Faceのモデル名
+            cache_dir: 量子化モデルの保存ディレクトリ（なければ変換して保存する）
+            threads: 推論のスレッド数（0で自動）
+        """
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("onnxruntimeがインストールされていません: pip install onnxruntime") from e
+
+        path = cache_path(model_name, cache_dir)
+        if not (path / "model.onnx").exists():
+            export_quantized_model(model_name, cache_dir)
+        else:
+            logger.info(f"量子化モデルをキャッシュから読み込みました: {path.name}")
+
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        config = AutoConfig.from_pretrained(path)
+        # パイプラインと同じく "entail" で始まるラベルを含意とみなす
+        self.entailment_id = -1
+        for label, index in config.label2id.items():
+            if label.lower().startswith("entail"):
+                self.entailment_id = index
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(str(path / "model.onnx"), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def logits(self, premises, hypotheses):
+        """
+        （前提, 仮説）のペアごとのNLIのロジット（含意・中立・矛盾）
+
+        Args:
+            premises: 前提（分類する文）のリスト
+            hypotheses: 仮説のリスト（premises と同じ長さ）
+
+        Returns:
+            (ペア数, クラス数) のロジットの配列
+        """
+        inputs = self.tokenizer(premises, hypotheses, padding=True, truncation="only_first", return_tensors="np")
+        feed = {name: inputs[name].astype(np.int64) for name in self.input_names}
+        return self.session.run(["logits"], feed)[0]
+
+    def entailment_logits(self, premises, hypotheses):
+        """（前提, 仮説）のペアごとの含意のロジット"""
+        return self.logits(premises, hypotheses)[:, self.entailment_id]
+
+    def __call__(self, sequence, candidate_labels, hypothesis_template="This example is {}."):
+        """
+        1文をゼロショット分類
+
+        Returns:
+            パイプラインと同じ形式の辞書（sequence, labels, scores）
+        """
+        hypotheses = [hypothesis_template.format(label) for label in candidate_labels]
+        logits = self.entailment_logits([sequence] * len(hypotheses), hypotheses).astype(np.float32)
+        # 最大値を引いてからソフトマックスを取る（exp のオーバーフローを防ぐ）
+        exp = np.exp(logits - logits.max())
+        scores = exp / exp.sum()
+        order = list(reversed(scores.argsort()))
+        return {
+            "sequence": sequence,
+            "labels": [candidate_labels[k] for k in order],
+            "scores": [scores[k].item() for k in order],
+        }
+
+
+def compare(model_name, text_paths, cache_dir=DEFAULT_CACHE_DIR):
+    """PyTorchとONNX Runtimeで同じファイルの文を分類し、結果を比較"""
+    from task_extractor import TaskExtractor
+
+    torch_extractor = TaskExtractor(model_name, batch_size=1)
+    onnx_extractor = TaskExtractor(model_name, batch_size=1, backend="onnx", onnx_cache_dir=cache_dir)
+
+    sentences = []
+    for text_path in text_paths:
+        text = Path(text_path).read_text(encoding="utf-8")
+        sentences.extend(s for s in torch_extractor.split_sentences(text)
+                         if len(s) >= torch_extractor.min_sentence_length)
+    if not sentences:
+        logger.info("分類する文がありません")
+        return
+
+    start_time = time.time()
+    torch_results = [torch_extractor._classify_sentence(sentence) for sentence in sentences]
+    torch_time = time.time() - start_time
+    start_time = time.time()
+    onnx_results = [onnx_extractor._classify_sentence(sentence) for sentence in sentences]
+    onnx_time = time.time() - start_time
+
+    agree = 0
+    max_diff = 0.0
+    for sentence, (torch_labels, torch_scores), (onnx_labels, onnx_scores) in zip(sentences, torch_results, onnx_results):
+        if torch_labels is None or onnx_labels is None:
+            continue  # 分類中にエラー
+        if torch_labels[0] == onnx_labels[0]:
+            agree += 1
+        else:
+            logger.info(f"  {sentence[:30]}: torch {torch_labels[0]} ({torch_scores[0]:.2f}) / "
+                        f"onnx {onnx_labels[0]} ({onnx_scores[0]:.2f})")
+        max_diff = max(max_diff, abs(torch_scores[0] - onnx_scores[onnx_labels.index(torch_labels[0])]))
+
+    logger.info(f"最上位ラベルの一致: {agree}/{len(sentences)}文, 最大スコア差: {max_diff:.3f} / "
+                f"処理時間 torch: {torch_time:.2f}秒, onnx int8: {onnx_time:.2f}秒")
+
+
+def compare_scoring(model_name, text_paths, backend="torch", cache_dir=DEFAULT_CACHE_DIR,
+                    gate_threshold=0.3, early_stop_confidence=0.5):
+    """同じファイルの文を single_label と early_stop で分類し、タスクかどうかの判定の一致を比較"""
+    from task_extractor import TaskExtractor
+
+    extractor = TaskExtractor(model_name, backend=backend, onnx_cache_dir=cache_dir,
+                              gate_threshold=gate_threshold, early_stop_confidence=early_stop_confidence)
+
+    sentences = []
+    for text_path in text_paths:
+        text = Path(text_path).read_text(encoding="utf-8")
+        sentences.extend(s for s in extractor.split_sentences(text) if len(s) >= extractor.min_sentence_length)
+    sentences = list(dict.fromkeys(sentences))
+    if not sentences:
+        logger.info("分類する文がありません")
+        return
+
+    start_time = time.time()
+    single_results = extractor._classify_batch(sentences)
+    single_time = time.time() - start_time
+    start_time = time.time()
+    early_results = extractor._classify_early_stop(sentences)
+    early_time = time.time() - start_time
+
+    agree = label_agree = missed = extra = single_tasks = 0
+    for sentence, (single_labels, single_scores), (early_labels, early_scores) in zip(
+            sentences, single_results, early_results):
+        single_task = extractor.is_task(single_labels, single_scores, "single_label")
+        early_task = extractor.is_task(early_labels, early_scores, "early_stop")
+        single_tasks += single_task
+        if single_task == early_task:
+            agree += 1
+            label_agree += single_task and single_labels[0] == early_labels[0]
+            continue
+        if single_task:
+            missed += 1
+        else:
+            extra += 1
+        logger.info(f"  {sentence[:30]}: single_label {single_labels[0]} ({single_scores[0]:.2f}) / "
+                    f"early_stop {early_labels[0]} ({early_scores[0]:.2f})")
+
+    logger.info(f"タスクの判定の一致: {agree}/{len(sentences)}文 "
+                f"(early_stopで見逃したタスク {missed}/{single_tasks}文, 増えたタスク {extra}文, "
+                f"両方でタスクの文のラベルの一致 {label_agree}文) / "
+                f"処理時間 single_label: {single_time:.2f}秒, early_stop: {early_time:.2f}秒")
+
+
+def main():
+    """コマンドライン処理"""
+    parser = argparse.ArgumentParser(description="NLIモデルのONNX変換とint8量子化")
+    parser.add_argument("--model", default="MoritzLaurer/mDeBERTa-v3-base-xnli-multilingual-nli-2mil7",
+                        help="Hugging Faceのモデル名")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="量子化モデルの保存ディレクトリ")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("export", help="ONNXに変換して量子化する（保存済みでも作り直す）")
+    compare_parser = subparsers.add_parser("compare", help="PyTorchのモデルとの分類結果を比較")
+    compare_parser.add_argument("files", nargs="+", help="比較に使うテキストファイル")
+    scoring_parser = subparsers.add_parser("scoring", help="early_stop と single_label のスコアリングの判定を比較")
+    scoring_parser.add_argument("--backend", default="torch", choices=("torch", "onnx"), help="推論のバックエンド")
+    scoring_parser.add_argument("--gate-threshold", type=float, default=0.3,
+                                help="early_stop でタスクらしくないと判定する確率")
+    scoring_parser.add_argument("--early-stop-confidence", type=float, default=0.5,
+                                help="early_stop でタスクと判定する確率の下限")
+    scoring_parser.add_argument("files", nargs="+", help="比較に使うテキストファイル")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "export":
+        export_quantized_model(args.model, Path(args.cache_dir))
+    else:
+        missing = [f for f in args.files if not Path(f).exists()]
+        if missing:
+            logger.error(f"ファイルが存在しません: {missing}")
+            sys.exit(1)
+        if args.command == "compare":
+            compare(args.model, args.files, Path(args.cache_dir))
+        else:
+            compare_scoring(args.model, args.files, backend=args.backend, cache_dir=Path(args.cache_dir),
+                            gate_threshold=args.gate_threshold, early_stop_confidence=args.early_stop_confidence)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,24 @@
 タスク抽出モジュール - NLIを使用したゼロショット分類
 """
 
+import gc       # ガベージコレクション（解放したモデルのメモリを回収する）
 import re       # 正規表現ライブラリ
+import time     # 時刻ライブラリ
 import logging  # ログ記録ライブラリ
+import threading    # スレッドライブラリ（アイドル時のモデル解放）
 from dataclasses import dataclass   # データクラスライブラリ（クラス定義を簡略化する。）
-from typing import List     # 型ヒント ライブラリ
+from typing import List, Tuple  # 型ヒント ライブラリ
 from datetime import datetime   # 日時（Data and Time）ライブラリ
 
+import numpy as np
 from transformers import pipeline
 import torch
 
 logger = logging.getLogger(__name__)
 
+CLASSIFIER_BACKENDS = ("torch", "onnx")
+SCORING_MODES = ("single_label", "early_stop")
+
 
 @dataclass
 class Task:
@@ -37,30 +44,124 @@ class Task:
 class TaskExtractor:
     """タスク抽出クラス"""
     
-    def __init__(self, model_name="MoritzLaurer/mDeBERTa-v3-base-xnli-multilingual-nli-2mil7"):
+    # 依頼・指示であることがはっきりしている表現（カスケードではモデルを使わずタスクと判定する）
+    strong_task_patterns = [
+        "してください", "して下さい", "してほしい", "して欲しい",
+        "していただけますか", "してもらえますか", "しなさい"
+    ]
+    # タスクの可能性がある表現（カスケードではモデルで判定する）
+    weak_task_patterns = [
+        "お願いします", "するように", "必要です", "必要があります", "すること"
+    ]
+    # 挨拶・相づちなど、それだけでは明らかにタスクではない文
+    non_task_sentence = re.compile(
+        r'^(よろしく|宜しく)?(お願い|おねがい)(いた|致)?します$|^以上(です|になります)$|'
+        r'^(お疲れ様|おつかれさま|ありがとう(ござい)?|おはよう(ござい)?)(です|でした|ました|ます)?$|'
+        r'^(はい|ええ|うん|なるほど|そうですね|了解です|わかりました|分かりました)$'
+    )
+    # 過去の出来事の報告で終わる文
+    report_sentence = re.compile(r'(ました|でした)$')
+    
+    def __init__(self, model_name="MoritzLaurer/mDeBERTa-v3-base-xnli-multilingual-nli-2mil7",
+                 idle_unload_sec=0, batch_size=32, cascade=False, cache=None,
+                 backend="torch", onnx_cache_dir=None, threads=0, scoring="single_label",
+                 gate_threshold=0.3, early_stop_confidence=0.5):
         """
         Args:
             model_name: 使用するモデル名
+            idle_unload_sec: 分類がこの秒数行われなかったらモデルを解放する（0で常に保持）
+            batch_size: まとめて推論する（文, ラベル）のペア数（1以下で1文ずつパイプラインで分類）
+            cascade: ルールで判定できる文はモデルを使わずに判定し、判定できない文だけをモデルで分類する
+            cache: 分類結果のキャッシュ（classification_cache.ClassificationCache、Noneで使わない）
+            backend: 推論に使うバックエンド（torch / onnx）。onnx はint8に量子化したモデルをONNX Runtimeで推論する
+            onnx_cache_dir: onnx の量子化モデルの保存ディレクトリ（Noneで onnx_classifier.DEFAULT_CACHE_DIR）
+            threads: onnx の推論のスレッド数（0で自動）
+            scoring: single_label はすべての候補ラベルを比べる（パイプラインと同じ結果）。
+                     early_stop はタスクのラベルをまとめた仮説でタスクらしくない文を打ち切る（_classify_early_stop）
+            gate_threshold: early_stop でまとめた仮説の含意の確率がこれ未満の文はタスクではないと判定する
+            early_stop_confidence: early_stop でタスクと判定するラベルの含意の確率の下限
+                                   （single_label の confidence_threshold とは確率の基準が異なるため別に設定する）
         """
-        logger.info(f"モデルを読み込み中: {model_name}")
+        if backend not in CLASSIFIER_BACKENDS:
+            raise ValueError(f"不明なバックエンドです: {backend}（{', '.join(CLASSIFIER_BACKENDS)}）")
+        if scoring not in SCORING_MODES:
+            raise ValueError(f"不明なスコアリングです: {scoring}（{', '.join(SCORING_MODES)}）")
+        self.model_name = model_name
+        self.idle_unload_sec = idle_unload_sec
+        self.batch_size = batch_size
+        self.cascade = cascade
+        self.cache = cache
+        self.backend = backend
+        self.onnx_cache_dir = onnx_cache_dir
+        self.threads = threads
+        self.scoring = scoring
+        self.lock = threading.Lock()  # 分類中にモデルを解放しないようにする
+        self.classifier = None
+        self.last_used = time.time()
+        self._load_classifier()
         
-        # CPU環境での実行を想定
-        self.classifier = pipeline(
-            "zero-shot-classification",
-            model=model_name,
-            device=-1  # CPU使用
-        )
+        # アイドル時のモデル解放
+        if idle_unload_sec > 0:
+            threading.Thread(target=self._unload_when_idle, daemon=True).start()
         
         # 候補ラベル
         self.candidate_labels = ["指示", "依頼", "要求", "タスク", "その他"]
         self.task_labels = ["指示", "依頼", "要求", "タスク"]
+        self.hypothesis_template = "この文は{}です。"
         
         # 設定
         self.min_sentence_length = 5
         self.confidence_threshold = 0.5
+        # early_stop の設定（onnx_classifier.py scoring で single_label との一致を確認して調整する）
+        self.gate_threshold = gate_threshold
+        self.early_stop_confidence = early_stop_confidence
         
         logger.info("タスク抽出器の初期化が完了しました")
     
+    def _load_classifier(self):
+        """分類モデルを読み込む（読み込み済みなら何もしない）"""
+        if self.classifier is not None:
+            return
+        
+        logger.info(f"モデルを読み込み中: {self.model_name}（バックエンド: {self.backend}）")
+        
+        if self.backend == "onnx":
+            # onnxruntime は onnx バックエンドを使う場合だけ必要
+            from onnx_classifier import DEFAULT_CACHE_DIR, OnnxZeroShotClassifier
+            self.classifier = OnnxZeroShotClassifier(
+                self.model_name,
+                cache_dir=self.onnx_cache_dir or DEFAULT_CACHE_DIR,
+                threads=self.threads
+            )
+            return
+        
+        # CPU環境での実行を想定
+        self.classifier = pipeline(
+            "zero-shot-classification",
+            model=self.model_name,
+            device=-1  # CPU使用
+        )
+    
+    def prewarm(self):
+        """解放したモデルを別スレッドで読み込んでおく（録音の開始を検出した時に呼ぶ）"""
+        def load():
+            with self.lock:
+                self.last_used = time.time()
+                self._load_classifier()
+        
+        if self.classifier is None:
+            threading.Thread(target=load, daemon=True).start()
+    
+    def _unload_when_idle(self):
+        """一定時間分類が行われなかったらモデルを解放"""
+        while True:
+            time.sleep(min(self.idle_unload_sec, 30))
+            with self.lock:
+                if self.classifier is not None and time.time() - self.last_used >= self.idle_unload_sec:
+                    logger.info(f"{self.idle_unload_sec:.0f}秒間処理がないためモデルを解放します")
+                    self.classifier = None
+                    gc.collect()
+    
     def split_sentences(self, text: str) -> List[str]:
         """テキストを文単位に分割"""
         # 句点、感嘆符、疑問符、改行で分割
@@ -82,31 +183,108 @@ class TaskExtractor:
         Returns:
             抽出されたタスクのリスト
         """
-        tasks = []
-        sentences = self.split_sentences(text)
+        return self.extract_tasks_batch([(text, file_name)])[0]
+    
+    def extract_tasks_batch(self, documents: List[Tuple[str, str]]) -> List[List[Task]]:
+        """
+        複数のテキストからまとめてタスクを抽出
         
-        logger.info(f"文を分割しました: {len(sentences)}文")
+        すべてのテキストの文をまとめて分類するため、1ファイルずつ処理するより速くなります。
         
-        for sentence in sentences:
-            # 短すぎる文はスキップ
-            if len(sentence) < self.min_sentence_length:
-                continue
+        Args:
+            documents: (テキスト, ソースファイル名) のリスト
             
+        Returns:
+            テキストごとの抽出されたタスクのリスト
+        """
+        with self.lock:
+            try:
+                return self._extract_tasks_batch(documents)
+            finally:
+                self.last_used = time.time()
+    
+    def _extract_tasks_batch(self, documents):
+        """extract_tasks_batch の本体（self.lock を保持した状態で呼ぶ）"""
+        # 短すぎる文を除いて、分類する文を集める
+        eligible = []
+        for text, _ in documents:
+            sentences = self.split_sentences(text)
+            logger.info(f"文を分割しました: {len(sentences)}文")
+            eligible.append([s for s in sentences if len(s) >= self.min_sentence_length])
+        
+        # ルールで判定できた文はモデルで分類しない
+        decided = {}
+        if self.cascade:
+            for sentences in eligible:
+                for sentence in sentences:
+                    if sentence not in decided:
+                        decided[sentence] = self._classify_by_rules(sentence)
+            self._log_cascade_stats([decided[sentence] for sentences in eligible for sentence in sentences])
+            decided = {sentence: d for sentence, d in decided.items() if d is not None}
+        
+        # 同じ文は1回だけ分類する
+        all_sentences = list(dict.fromkeys(
+            sentence for sentences in eligible for sentence in sentences if sentence not in decided
+        ))
+        
+        # キャッシュにある文はモデルで分類しない
+        if self.cache is not None and all_sentences:
+            keys = {sentence: self._cache_key(sentence) for sentence in all_sentences}
+            for sentence in all_sentences:
+                cached = self.cache.get(keys[sentence])
+                if cached is not None:
+                    decided[sentence] = cached
+            all_sentences = [sentence for sentence in all_sentences if sentence not in decided]
+        
+        if all_sentences:
+            # 解放されている場合は読み込み直す
+            self._load_classifier()
+        # early_stop に失敗して single_label で分類した文（判定の閾値が異なり、early_stop のキーではキャッシュしない）
+        single_label_fallback = set()
+        if self.scoring == "early_stop" and all_sentences:
             try:
-                # ゼロショット分類
-                result = self.classifier(
-                    sentence,
-                    candidate_labels=self.candidate_labels,
-                    hypothesis_template="この文は{}です。"
-                )
+                classified = self._classify_early_stop(all_sentences)
+            except Exception as e:
+                logger.error(f"分類中にエラー（1文ずつ分類します）: {e}")
+                classified = [self._classify_sentence(sentence) for sentence in all_sentences]
+                single_label_fallback.update(all_sentences)
+        elif self.batch_size > 1 and all_sentences:
+            try:
+                classified = self._classify_batch(all_sentences)
+            except Exception as e:
+                logger.error(f"バッチ分類中にエラー（1文ずつ分類します）: {e}")
+                classified = [self._classify_sentence(sentence) for sentence in all_sentences]
+        else:
+            classified = [self._classify_sentence(sentence) for sentence in all_sentences]
+        
+        for sentence, (labels, scores) in zip(all_sentences, classified):
+            decided[sentence] = (labels, scores)
+            if self.cache is not None and labels is not None and sentence not in single_label_fallback:
+                self.cache.put(keys[sentence], labels, scores)
+        
+        if self.cache is not None:
+            # 保存は呼び出し側（main.py の監視ループ）でまとめて行う
+            stats = self.cache.stats()
+            logger.info(
+                f"分類キャッシュ: {stats['entries']}件, ヒット率 {stats['hit_rate']:.0%} "
+                f"({stats['hits']}/{stats['hits'] + stats['misses']}), 削除 {stats['evictions']}件"
+            )
+        
+        results = []
+        for (_, file_name), sentences in zip(documents, eligible):
+            tasks = []
+            for sentence in sentences:
+                labels, scores = decided[sentence]
+                if labels is None:
+                    continue  # 分類中にエラー
                 
                 # 最も確信度の高いラベルを取得
-                top_label = result['labels'][0]
-                top_score = result['scores'][0]
+                top_label = labels[0]
+                top_score = scores[0]
                 
                 # タスクとして判定
-                if (top_label in self.task_labels and 
-                    top_score >= self.confidence_threshold):
+                scoring = "single_label" if sentence in single_label_fallback else self.scoring
+                if self.is_task(labels, scores, scoring):
                     
                     task = Task(
                         text=sentence,
@@ -118,13 +296,202 @@ class TaskExtractor:
                     tasks.append(task)
                     
                     logger.debug(f"タスクを検出: {sentence[:30]}... ({top_label}: {top_score:.2f})")
-                    
-            except Exception as e:
-                logger.error(f"文の分類中にエラー: {e}")
-                continue
+            
+            logger.info(f"抽出されたタスク数: {len(tasks)}")
+            results.append(tasks)
+        return results
+    
+    def is_task(self, labels, scores, scoring="single_label"):
+        """
+        分類結果がタスクか判定
+        
+        Args:
+            labels, scores: 確信度の高い順のラベルとスコア
+            scoring: スコアを計算したスコアリング（確率の基準によって閾値が異なる）
+        """
+        threshold = self.early_stop_confidence if scoring == "early_stop" else self.confidence_threshold
+        return labels[0] in self.task_labels and scores[0] >= threshold
+    
+    def _cache_key(self, sentence):
+        """分類キャッシュのキー（ラベル・テンプレート・モデル・バックエンド・スコアリングが変われば別のキーになる）"""
+        return self.cache.make_key(sentence, self.candidate_labels, self.hypothesis_template, self.model_name,
+                                   scoring=self.scoring if self.scoring != "single_label" else None,
+                                   backend=self.backend)
+    
+    def _classify_by_rules(self, sentence):
+        """
+        モデルを使わずにルールで判定
+        
+        Returns:
+            _classify_sentence と同じ形式の (ラベル, スコア)（タスクのスコアは extract_tasks_lightweight と同じ）。
+            判定できない場合はNone
+        """
+        if any(pattern in sentence for pattern in self.strong_task_patterns):
+            return ["タスク"], [0.8]
+        if self.non_task_sentence.match(sentence):
+            return ["その他"], [1.0]
+        if any(pattern in sentence for pattern in self.weak_task_patterns):
+            return None
+        if self.report_sentence.search(sentence):
+            return ["その他"], [1.0]
+        return None
+    
+    def _log_cascade_stats(self, decisions):
+        """カスケードの段階ごとに判定できた文の割合をログに出力"""
+        total = len(decisions)
+        if total == 0:
+            return
+        task_hits = sum(1 for d in decisions if d is not None and d[0][0] in self.task_labels)
+        non_task_hits = sum(1 for d in decisions if d is not None and d[0][0] not in self.task_labels)
+        model_count = total - task_hits - non_task_hits
+        logger.info(
+            f"カスケード判定（{total}文）: "
+            f"タスクのルール {task_hits}文 ({task_hits / total:.0%}), "
+            f"タスク以外のルール {non_task_hits}文 ({non_task_hits / total:.0%}), "
+            f"モデル {model_count}文 ({model_count / total:.0%})"
+        )
+    
+    def _classify_sentence(self, sentence):
+        """
+        1文をパイプラインでゼロショット分類
+        
+        Returns:
+            (確信度の高い順のラベル, スコア)。エラーの場合は (None, None)
+        """
+        try:
+            result = self.classifier(
+                sentence,
+                candidate_labels=self.candidate_labels,
+                hypothesis_template=self.hypothesis_template
+            )
+            return result['labels'], result['scores']
+        except Exception as e:
+            logger.error(f"文の分類中にエラー: {e}")
+            return None, None
+    
+    def _classify_batch(self, sentences):
+        """
+        複数の文をまとめてゼロショット分類（パイプラインと同じ計算を行う）
+        
+        すべての（文, ラベル）のペアを長さ順に並べ、長さの近いペアどうしで
+        パディングしたミニバッチにしてNLIモデルに通します。
+        
+        Returns:
+            文ごとの (確信度の高い順のラベル, スコア) のリスト
+        """
+        hypotheses = [self.hypothesis_template.format(label) for label in self.candidate_labels]
+        logits = self._pair_logits(
+            [sentence for sentence in sentences for _ in hypotheses],
+            [hypothesis for _ in sentences for hypothesis in hypotheses]
+        )
+        entail_logits = logits[:, self.classifier.entailment_id].reshape(len(sentences), len(hypotheses))
+        
+        # パイプラインの後処理（ラベルごとの含意のロジットのソフトマックス）と同じ
+        scores = np.exp(entail_logits) / np.exp(entail_logits).sum(-1, keepdims=True)
+        results = []
+        for row in scores:
+            order = list(reversed(row.argsort()))
+            results.append(([self.candidate_labels[k] for k in order], [row[k].item() for k in order]))
+        return results
+    
+    def _classify_early_stop(self, sentences):
+        """
+        タスクらしくない文を1つの仮説で打ち切り、残りの文だけをタスクのラベルごとに調べる分類
+        
+        NLIモデルは文と仮説を一緒にエンコードするため、文のエンコードを仮説の間で使い回すことはできません。
+        代わりにモデルに通す（文, 仮説）のペアの数を減らします。
+        1. すべてのタスクのラベルをまとめた仮説（「この文は指示、依頼、要求、またはタスクです。」）の
+           含意の確率が gate_threshold 未満の文はタスクではないと判定する（ほとんどの文は1回で終わる）
+        2. 残りの文はすべてのタスクのラベルを調べ、最も確率の高いラベルを選ぶ（ラベルの順番に結果が左右されない。
+           「その他」の仮説は調べない）
+        確率はパイプラインの multi_label と同じく、ラベルごとの含意と矛盾のロジットのソフトマックスです。
+        single_label のスコアとは基準が異なるため、タスクの判定には early_stop_confidence を使います。
+        
+        Returns:
+            文ごとの (ラベル, スコア) のリスト（最も確率の高いラベルだけを含む）
+        """
+        results = [None] * len(sentences)
+        
+        # 1. タスクのラベルをまとめた仮説で候補を絞る
+        gate_hypothesis = self.hypothesis_template.format(
+            "、".join(self.task_labels[:-1]) + "、または" + self.task_labels[-1]
+        )
+        gate_probs = self._entailment_probs(sentences, [gate_hypothesis] * len(sentences))
+        pending = []
+        for i, prob in enumerate(gate_probs):
+            if prob < self.gate_threshold:
+                results[i] = (["その他"], [1.0 - prob])
+            else:
+                pending.append(i)
+        gated = len(sentences) - len(pending)
+        
+        # 2. 残りの文はタスクのラベルをすべて調べる
+        hypotheses = [self.hypothesis_template.format(label) for label in self.task_labels]
+        forwards = len(sentences) + len(pending) * len(hypotheses)
+        if pending:
+            probs = self._entailment_probs(
+                [sentences[i] for i in pending for _ in hypotheses],
+                [hypothesis for _ in pending for hypothesis in hypotheses]
+            )
+            for n, i in enumerate(pending):
+                row = probs[n * len(hypotheses):(n + 1) * len(hypotheses)]
+                k = max(range(len(row)), key=lambda k: row[k])
+                results[i] = ([self.task_labels[k]], [row[k]])
         
-        logger.info(f"抽出されたタスク数: {len(tasks)}")
-        return tasks
+        logger.info(
+            f"早期打ち切り分類（{len(sentences)}文）: 1回目で除外 {gated}文, "
+            f"推論したペア {forwards}（すべてのラベルでは {len(sentences) * len(self.candidate_labels)}）"
+        )
+        return results
+    
+    def _entailment_probs(self, premises, hypotheses):
+        """（前提, 仮説）のペアごとの含意の確率（含意と矛盾のロジットのソフトマックス）"""
+        logits = self._pair_logits(premises, hypotheses)
+        entailment_id = self.classifier.entailment_id
+        # パイプラインと同じく、含意が先頭のラベルでなければ先頭を矛盾とみなす
+        contradiction_id = -1 if entailment_id == 0 else 0
+        pair = logits[:, [contradiction_id, entailment_id]].astype(np.float32)
+        exp = np.exp(pair - pair.max(-1, keepdims=True))
+        probs = exp / exp.sum(-1, keepdims=True)
+        return [prob.item() for prob in probs[:, 1]]
+    
+    def _pair_logits(self, premises, hypotheses):
+        """
+        （前提, 仮説）のペアごとのNLIのロジットをまとめて計算
+        
+        ペアを長さ順に並べ、長さの近いペアどうしでパディングしたミニバッチにしてNLIモデルに通します。
+        
+        Returns:
+            (ペア数, クラス数) のロジットの配列（引数の順）
+        """
+        # 長さの近いペアを同じミニバッチにしてパディングを減らす
+        order = sorted(range(len(premises)), key=lambda k: len(premises[k]) + len(hypotheses[k]))
+        batch_size = max(1, self.batch_size)
+        
+        results = None
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            logits = self._nli_logits([premises[k] for k in batch], [hypotheses[k] for k in batch])
+            if results is None:
+                results = np.zeros((len(premises), logits.shape[1]), dtype=np.float32)
+            results[batch] = logits
+        return results
+    
+    def _nli_logits(self, premises, hypotheses):
+        """（前提, 仮説）のペアごとのNLIのロジット（1回の推論）"""
+        if self.backend == "onnx":
+            return self.classifier.logits(premises, hypotheses)
+        
+        inputs = self.classifier.tokenizer(
+            premises,
+            hypotheses,
+            padding=True,
+            truncation="only_first",
+            return_tensors="pt"
+        )
+        with torch.no_grad():
+            logits = self.classifier.model(**inputs).logits
+        return logits.numpy()
     
     def extract_tasks_lightweight(self, text: str, file_name: str) -> List[Task]:
         """
@@ -134,12 +501,7 @@ class TaskExtractor:
         sentences = self.split_sentences(text)
         
         # タスクパターン
-        task_patterns = [
-            "してください", "して下さい", "お願いします", 
-            "してほしい", "して欲しい", "していただけますか",
-            "してもらえますか", "しなさい", "するように",
-            "必要です", "必要があります", "すること"
-        ]
+        task_patterns = self.strong_task_patterns + self.weak_task_patterns
         
         for sentence in sentences:
             if len(sentence) < self.min_sentence_length:
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+テキストファイル監視のテスト
+whisper_transcriber は長い録音の文字起こしを途中経過ファイル（.txt.partial）に書き出し、
+最後に .txt へ名前を変更して確定するため、名前変更でもタスク抽出が行われることを確認します。
+
+実行:
+    python -m pytest test_file_handler.py
+"""
+
+import os
+import sys
+import time
+import importlib
+from pathlib import Path
+
+import pytest
+
+# main.py が読み込むパッケージがない環境ではスキップする
+pytest.importorskip("dotenv")
+pytest.importorskip("watchdog")
+pytest.importorskip("linebot")
+pytest.importorskip("transformers")
+pytest.importorskip("torch")
+
+from watchdog.observers import Observer
+
+
+class FakeTaskExtractor:
+    """モデルを読み込まずに、渡されたテキストを記録するタスク抽出器"""
+
+    def __init__(self):
+        self.documents = []
+
+    def extract_tasks_batch(self, documents):
+        self.documents.extend(documents)
+        return [[] for _ in documents]
+
+
+class FakeLineNotifier:
+    """送信せずに、通知したファイル名を記録するLINE通知"""
+
+    def __init__(self):
+        self.file_names = []
+
+    def send_notification(self, tasks, full_text, file_name):
+        self.file_names.append(file_name)
+        return True
+
+
+@pytest.fixture
+def main_module(tmp_path, monkeypatch):
+    # main.py はインポート時にカレントディレクトリへログファイルを作るため、一時ディレクトリで読み込む
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(Path(__file__).parent))
+    module = importlib.import_module("main")
+    module.PROCESSED_FILES.clear()
+    yield module
+    module.PROCESSED_FILES.clear()
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_partial_file_renamed_to_txt_is_processed(main_module, tmp_path):
+    """.txt.partial から .txt への名前変更（移動イベント）でタスク抽出と通知が行われる"""
+    text_dir = tmp_path / "text"
+    text_dir.mkdir()
+    extractor = FakeTaskExtractor()
+    notifier = FakeLineNotifier()
+    handler = main_module.TextFileHandler(extractor, notifier)
+
+    observer = Observer()
+    observer.schedule(handler, str(text_dir), recursive=False)
+    observer.start()
+    try:
+        partial_path = text_dir / "recording-20250101-120000.txt.partial"
+        partial_path.write_text("来週までに報告書を作成してください。", encoding="utf-8")
+        os.replace(partial_path, text_dir / "recording-20250101-120000.txt")
+
+        assert _wait_for(lambda: notifier.file_names)
+    finally:
+        observer.stop()
+        observer.join()
+
+    assert notifier.file_names == ["recording-20250101-120000.txt"]
+    assert extractor.documents == [("来週までに報告書を作成してください。", "recording-20250101-120000.txt")]
+
+
+def test_moved_event_ignores_non_text_files(main_module, tmp_path):
+    """.txt 以外への名前変更（暫定テキストの更新など）は処理しない"""
+    from watchdog.events import FileMovedEvent
+
+    extractor = FakeTaskExtractor()
+    notifier = FakeLineNotifier()
+    handler = main_module.TextFileHandler(extractor, notifier)
+
+    provisional_path = tmp_path / "recording.txt.provisional"
+    provisional_path.write_text("暫定テキスト", encoding="utf-8")
+    handler.on_moved(FileMovedEvent(str(tmp_path / "recording.txt.tmp"), str(provisional_path)))
+
+    assert notifier.file_names == []
+    assert extractor.documents == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
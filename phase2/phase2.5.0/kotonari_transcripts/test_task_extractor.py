@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+タスク抽出（task_extractor.py）のテスト
+
+実行:
+    python -m pytest test_task_extractor.py
+"""
+
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("transformers")
+pytest.importorskip("torch")
+
+import task_extractor
+from classification_cache import ClassificationCache
+
+# 文ごとの仮説の含意のロジット（中立・矛盾のロジットは0）
+ENTAILMENT = {
+    "来週までに報告書を作ること": {"指示": 1.0, "依頼": 4.0, "要求": 2.0, "タスク": 2.5, "その他": -2.0},
+    "明日の会議は14時からです": {"指示": -3.0, "依頼": -3.0, "要求": -3.0, "タスク": -3.0, "その他": 3.0},
+}
+
+
+class FakePipeline:
+    """モデルを読み込まずに ENTAILMENT のロジットを返すゼロショット分類パイプライン"""
+
+    entailment_id = 0
+
+    def __call__(self, sequence, candidate_labels, hypothesis_template):
+        logits = np.array([ENTAILMENT[sequence][label] for label in candidate_labels])
+        scores = np.exp(logits) / np.exp(logits).sum()
+        order = list(reversed(scores.argsort()))
+        return {"labels": [candidate_labels[k] for k in order], "scores": [scores[k].item() for k in order]}
+
+
+def _fake_logits(extractor, premises, hypotheses):
+    """仮説の文からラベルを取り出して ENTAILMENT のロジットを返す（まとめた仮説はタスクのラベルの最大）"""
+    logits = np.zeros((len(premises), 3), dtype=np.float32)
+    for n, (premise, hypothesis) in enumerate(zip(premises, hypotheses)):
+        label = hypothesis[len("この文は"):-len("です。")]
+        values = ENTAILMENT[premise]
+        logits[n, 0] = values.get(label, max(values[task_label] for task_label in extractor.task_labels))
+    return logits
+
+
+@pytest.fixture
+def make_extractor(monkeypatch):
+    monkeypatch.setattr(task_extractor, "pipeline", lambda *args, **kwargs: FakePipeline())
+
+    def make(**kwargs):
+        extractor = task_extractor.TaskExtractor(**kwargs)
+        monkeypatch.setattr(extractor, "_nli_logits", lambda premises, hypotheses:
+                            _fake_logits(extractor, premises, hypotheses))
+        return extractor
+    return make
+
+
+def test_early_stop_label_does_not_depend_on_label_order(make_extractor):
+    """early_stop で選ばれるラベルはタスクのラベルの順番に左右されない"""
+    extractor = make_extractor(scoring="early_stop")
+    sentences = list(ENTAILMENT)
+
+    expected = extractor._classify_early_stop(sentences)
+    extractor.task_labels = list(reversed(extractor.task_labels))
+    actual = extractor._classify_early_stop(sentences)
+
+    assert actual == expected
+    assert expected[0][0] == ["依頼"]
+    assert expected[1][0] == ["その他"]
+
+
+def test_early_stop_fallback_is_not_cached_under_early_stop_key(make_extractor, monkeypatch):
+    """early_stop に失敗して single_label で分類した結果は early_stop のキーでキャッシュしない"""
+    cache = ClassificationCache()
+    extractor = make_extractor(scoring="early_stop", cache=cache)
+
+    def fail(sentences):
+        raise RuntimeError("推論エラー")
+    monkeypatch.setattr(extractor, "_classify_early_stop", fail)
+
+    tasks = extractor.extract_tasks("来週までに報告書を作ること。明日の会議は14時からです。", "meeting.txt")
+
+    assert [task.text for task in tasks] == ["来週までに報告書を作ること"]
+    assert cache.stats()["entries"] == 0
+
+
+def test_early_stop_thresholds_are_configurable(make_extractor):
+    """early_stop のタスクの判定には early_stop_confidence を使う"""
+    extractor = make_extractor(scoring="early_stop", early_stop_confidence=0.99)
+
+    assert extractor.extract_tasks("来週までに報告書を作ること。", "meeting.txt") == []
+
+
+@pytest.fixture(scope="module")
+def real_extractor():
+    # 初回はモデルをダウンロードします
+    return task_extractor.TaskExtractor(batch_size=4)
+
+
+def test_batch_classification_matches_pipeline(real_extractor):
+    """まとめて分類した結果がパイプラインで1文ずつ分類した結果と同じになる"""
+    sentences = [
+        "来週までに報告書を作成してください",
+        "山田さんに資料を送る必要があります",
+        "明日の会議は14時からです",
+        "サーバーのバックアップを実施すること",
+        "先週の売上は前年より増えました",
+    ]
+
+    batched = real_extractor._classify_batch(sentences)
+
+    for sentence, (labels, scores) in zip(sentences, batched):
+        expected_labels, expected_scores = real_extractor._classify_sentence(sentence)
+        assert labels == expected_labels
+        assert scores == pytest.approx(expected_scores, abs=1e-4)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,342 @@
+"""
+音声データ処理ユーティリティ
+Whisperに渡す前の音声配列（float32, -1.0〜1.0）を扱う関数群です。
+"""
+
+import struct
+import hashlib
+
+import numpy as np
+
+
+class UnsupportedWavFormat(ValueError):
+    """ネイティブローダーで扱えないWAV形式"""
+
+
+def _parse_wav_header(path):
+    """RIFFチャンクを解析し、(fmtチャンク, dataの開始位置, ヘッダー上のdataのバイト数, ファイルサイズ) を返す"""
+    with open(path, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            raise UnsupportedWavFormat("RIFF/WAVEヘッダーがありません")
+
+        fmt = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise UnsupportedWavFormat("dataチャンクが見つかりません")
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+
+            if chunk_id == b'fmt ':
+                fmt = f.read(chunk_size)
+                if len(fmt) < 16:
+                    raise UnsupportedWavFormat("fmtチャンクが不正です")
+                f.seek(chunk_size % 2, 1)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise UnsupportedWavFormat("fmtチャンクがdataチャンクより後にあります")
+                data_offset = f.tell()
+                break
+            else:
+                # 奇数長のチャンクは1バイトのパディングが入る
+                f.seek(chunk_size + chunk_size % 2, 1)
+
+        f.seek(0, 2)
+        file_size = f.tell()
+
+    return fmt, data_offset, chunk_size, file_size
+
+
+def read_wav_header(path):
+    """
+    WAVファイルのヘッダーを解析
+
+    Args:
+        path: WAVファイルのパス
+
+    Returns:
+        (サンプリングレート, チャンネル数, dataチャンクの開始位置, dataチャンクのバイト数)
+    """
+    fmt, data_offset, chunk_size, file_size = _parse_wav_header(path)
+
+    audio_format, channels, sample_rate, _, _, bits_per_sample = struct.unpack('<HHIIHH', fmt[:16])
+    if audio_format != 1 or bits_per_sample != 16:
+        raise UnsupportedWavFormat(f"16bit PCM以外の形式です (format={audio_format}, bits={bits_per_sample})")
+    if channels < 1 or sample_rate <= 0:
+        raise UnsupportedWavFormat("チャンネル数またはサンプリングレートが不正です")
+
+    # 書き込み途中などでヘッダーの長さが実際のサイズを超える場合は切り詰める
+    # （長さが未確定（0 や 0xFFFFFFFF）の場合は書き込まれている分をすべて使う）
+    if chunk_size in (0, 0xFFFFFFFF):
+        chunk_size = file_size - data_offset
+    data_size = min(chunk_size, file_size - data_offset)
+    return sample_rate, channels, data_offset, data_size
+
+
+def wav_is_complete(path):
+    """
+    ヘッダーに書かれたdataチャンクの長さ分のデータが書き込まれているか確認
+
+    ヘッダーを解析できない場合や、長さが未確定（0 や 0xFFFFFFFF）の場合はFalseを返します。
+    """
+    try:
+        _, data_offset, chunk_size, file_size = _parse_wav_header(path)
+    except (OSError, UnsupportedWavFormat, struct.error):
+        return False
+    if chunk_size in (0, 0xFFFFFFFF):
+        return False
+    return file_size >= data_offset + chunk_size
+
+
+def pcm_hash(path, block_size=1 << 20):
+    """
+    音声データのハッシュ（blake2b, 128bit）
+
+    16bit PCM WAVの場合はdataチャンクとフォーマットのみを対象にするため、
+    ファイル名やヘッダー内のメタデータが異なっても同じ値になります。
+    それ以外の形式はファイル全体を対象にします。
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        sample_rate, channels, offset, size = read_wav_header(path)
+        digest.update(struct.pack('<II', sample_rate, channels))
+    except UnsupportedWavFormat:
+        offset, size = 0, None
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        remaining = size
+        while remaining is None or remaining > 0:
+            block = f.read(block_size if remaining is None else min(block_size, remaining))
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
+def resample(audio, orig_rate, target_rate):
+    """
+    FFTによる帯域制限リサンプリング
+
+    Args:
+        audio: 1次元のfloat32音声配列
+        orig_rate: 元のサンプリングレート
+        target_rate: 変換後のサンプリングレート
+
+    Returns:
+        リサンプリング後のfloat32配列
+    """
+    if orig_rate == target_rate or len(audio) == 0:
+        return np.asarray(audio, dtype=np.float32)
+
+    target_len = int(round(len(audio) * target_rate / orig_rate))
+    spectrum = np.fft.rfft(audio)
+    # ナイキスト周波数より上の成分を落とす（アップサンプリング時はゼロ埋め）
+    resized = np.zeros(target_len // 2 + 1, dtype=spectrum.dtype)
+    n_bins = min(len(spectrum), len(resized))
+    resized[:n_bins] = spectrum[:n_bins]
+    resampled = np.fft.irfft(resized, n=target_len) * (target_len / len(audio))
+    return resampled.astype(np.float32)
+
+
+def load_wav(path, target_rate=16000):
+    """
+    16bit PCM WAVをffmpegを使わずに読み込む
+
+    dataチャンクをメモリマップし、モノラルのfloat32に変換して
+    target_rateへリサンプリングします。
+
+    Args:
+        path: WAVファイルのパス
+        target_rate: 変換後のサンプリングレート
+
+    Returns:
+        float32の音声配列（-1.0〜1.0）
+    """
+    sample_rate, channels, data_offset, data_size = read_wav_header(path)
+
+    n_frames = data_size // (2 * channels)
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    pcm = np.memmap(path, dtype='<i2', mode='r', offset=data_offset, shape=(n_frames * channels,))
+    try:
+        if channels > 1:
+            audio = pcm.reshape(n_frames, channels).mean(axis=1, dtype=np.float32) / 32768.0
+        else:
+            audio = pcm.astype(np.float32) / 32768.0
+    finally:
+        del pcm
+
+    return resample(audio, sample_rate, target_rate)
+
+
+def wav_duration(path):
+    """16bit PCM WAVの長さ（秒）"""
+    sample_rate, channels, _, data_size = read_wav_header(path)
+    return data_size // (2 * channels) / sample_rate
+
+
+def read_wav_window(path, start_sec, duration_sec, target_rate=16000):
+    """
+    16bit PCM WAVの一部分だけを読み込む
+
+    dataチャンクのうち指定した区間だけをメモリマップから読み出すため、
+    ファイルの長さに関係なくメモリ使用量は区間の長さで決まります。
+
+    Args:
+        path: WAVファイルのパス
+        start_sec: 区間の開始位置（秒）
+        duration_sec: 区間の長さ（秒）
+        target_rate: 変換後のサンプリングレート
+
+    Returns:
+        float32の音声配列（-1.0〜1.0）。ファイルの末尾を超えた部分は含まない
+    """
+    sample_rate, channels, data_offset, data_size = read_wav_header(path)
+
+    n_frames = data_size // (2 * channels)
+    start = min(int(start_sec * sample_rate), n_frames)
+    end = min(start + int(duration_sec * sample_rate), n_frames)
+    if end <= start:
+        return np.zeros(0, dtype=np.float32)
+
+    pcm = np.memmap(path, dtype='<i2', mode='r', offset=data_offset + start * 2 * channels,
+                    shape=((end - start) * channels,))
+    try:
+        if channels > 1:
+            audio = pcm.reshape(end - start, channels).mean(axis=1, dtype=np.float32) / 32768.0
+        else:
+            audio = pcm.astype(np.float32) / 32768.0
+    finally:
+        del pcm
+
+    return resample(audio, sample_rate, target_rate)
+
+
+def frame_energy_db(audio, sample_rate, frame_ms=30):
+    """
+    フレームごとのRMSエネルギー（dBFS）を計算
+
+    Args:
+        audio: 1次元のfloat32音声配列
+        sample_rate: サンプリングレート
+        frame_ms: フレーム長（ミリ秒）
+
+    Returns:
+        フレームごとのエネルギー（dBFS）の配列
+    """
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    n_frames = len(audio) // frame_len
+    if n_frames == 0:
+        return np.empty(0, dtype=np.float32)
+
+    # (フレーム数, フレーム長) に並べ替えて一括計算
+    frames = np.asarray(audio[:n_frames * frame_len], dtype=np.float32).reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(np.square(frames), axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def find_speech_region(audio, sample_rate, threshold_db=-45.0, min_speech_ms=300,
+                       padding_ms=300, frame_ms=30):
+    """
+    発話区間（最初の有音フレーム〜最後の有音フレーム）を検出
+
+    Args:
+        audio: 1次元のfloat32音声配列
+        sample_rate: サンプリングレート
+        threshold_db: 有音と判定するエネルギーの閾値（dBFS）
+        min_speech_ms: 有音フレームの合計がこれ未満なら無音とみなす
+        padding_ms: 検出区間の前後に残す余白
+        frame_ms: フレーム長（ミリ秒）
+
+    Returns:
+        (開始サンプル, 終了サンプル)。発話がない場合はNone
+    """
+    energy = frame_energy_db(audio, sample_rate, frame_ms)
+    voiced = np.flatnonzero(energy > threshold_db)
+
+    if len(voiced) * frame_ms < min_speech_ms:
+        return None
+
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    padding = int(sample_rate * padding_ms / 1000)
+    start = max(0, voiced[0] * frame_len - padding)
+    end = min(len(audio), (voiced[-1] + 1) * frame_len + padding)
+    return int(start), int(end)
+
+
+def find_split_points(audio, sample_rate, span_sec, search_sec=5.0, frame_ms=30):
+    """
+    音声を span_sec 程度の区間に分割する位置を無音（エネルギーの低いフレーム）から探す
+
+    Args:
+        audio: 1次元のfloat32音声配列
+        sample_rate: サンプリングレート
+        span_sec: 区間の目安の長さ（秒）
+        search_sec: 目安の位置の前後何秒以内で分割位置を探すか
+        frame_ms: フレーム長（ミリ秒）
+
+    Returns:
+        分割位置（サンプル）のリスト。分割しない場合は空
+    """
+    energy = frame_energy_db(audio, sample_rate, frame_ms)
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    return [cut * frame_len for cut in _choose_split_frames(energy, span_sec, search_sec, frame_ms)]
+
+
+def find_wav_split_points(path, span_sec, search_sec=5.0, frame_ms=30, window_sec=120.0, target_rate=16000):
+    """
+    16bit PCM WAVを一括で読み込まずに、find_split_points と同じ分割位置を探す
+
+    window_sec 秒ずつ読み込んでフレームごとのエネルギーだけを残すため、
+    メモリ使用量は録音の長さではなく区間の長さで決まります。
+
+    Args:
+        path: WAVファイルのパス
+        span_sec: 区間の目安の長さ（秒）
+        search_sec: 目安の位置の前後何秒以内で分割位置を探すか
+        frame_ms: フレーム長（ミリ秒）
+        window_sec: 一度に読み込む長さ（秒）
+        target_rate: 変換後のサンプリングレート
+
+    Returns:
+        分割位置（秒）のリスト。分割しない場合は空
+    """
+    duration = wav_duration(path)
+    frame_len = max(1, int(target_rate * frame_ms / 1000))
+    energies = []
+    carry = np.zeros(0, dtype=np.float32)  # フレームに満たず次の読み込みに回すサンプル
+    position = 0.0
+    while position < duration:
+        audio = read_wav_window(path, position, window_sec, target_rate)
+        if len(audio) == 0:
+            break
+        position += window_sec
+        audio = np.concatenate([carry, audio])
+        n_frames = len(audio) // frame_len
+        energies.append(frame_energy_db(audio[:n_frames * frame_len], target_rate, frame_ms))
+        carry = audio[n_frames * frame_len:]
+
+    energy = np.concatenate(energies) if energies else np.empty(0, dtype=np.float32)
+    return [cut * frame_len / target_rate for cut in _choose_split_frames(energy, span_sec, search_sec, frame_ms)]
+
+
+def _choose_split_frames(energy, span_sec, search_sec, frame_ms):
+    """フレームごとのエネルギーから、span_sec 程度ごとに最も静かなフレームを選ぶ"""
+    span_frames = max(1, int(span_sec * 1000 / frame_ms))
+    search_frames = int(search_sec * 1000 / frame_ms)
+
+    cuts = []
+    last = 0
+    # 残りが区間1つ分 + 探索幅より長い間だけ分割する（末尾に短すぎる区間を作らない）
+    while len(energy) - last > span_frames + search_frames:
+        target = last + span_frames
+        low = max(last + 1, target - search_frames)
+        high = min(len(energy), target + search_frames + 1)
+        cut = low + int(np.argmin(energy[low:high]))
+        cuts.append(cut)
+        last = cut
+    return cuts
@@ -0,0 +1,254 @@
+"""
+Whisperデコード処理
+事前に計算したlog-melスペクトログラムから文字起こしを行います。
+whisper.transcribe と同じ手順（30秒窓のシーク、温度フォールバック、
+無音判定、前の窓のテキストによる条件付け）をmel入力向けに実装しています。
+"""
+
+import torch
+import whisper
+from whisper.audio import HOP_LENGTH, N_FRAMES, N_SAMPLES, SAMPLE_RATE
+from whisper.decoding import DecodingOptions
+from whisper.tokenizer import get_tokenizer
+
+# whisper.transcribe のデフォルト値
+DEFAULT_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+# 遅延の段階ごとのデコード手順（(温度, ビーム幅) の列）
+# 最初は温度0の貪欲法でデコードし、閾値を満たさない窓だけ次の手順で再デコードする
+DECODING_TIERS = {
+    # whisper.transcribe と同じ（温度を1.0まで上げながら最大5回再デコード）
+    "accurate": tuple((temperature, None) for temperature in DEFAULT_TEMPERATURES),
+    # ビームサーチ → 温度0.6 の最大2回まで
+    "balanced": ((0.0, None), (0.0, 5), (0.6, None)),
+    # ビームサーチ1回まで
+    "fast": ((0.0, None), (0.0, 5)),
+}
+
+
+def compute_mel(audio, n_mels):
+    """
+    音声配列からlog-melスペクトログラムを計算（末尾に30秒分の無音を付与）
+
+    Args:
+        audio: 16kHzのfloat32音声配列
+        n_mels: モデルのメル周波数ビン数（model.dims.n_mels）
+
+    Returns:
+        (n_mels, フレーム数) のtorch.Tensor
+    """
+    return whisper.log_mel_spectrogram(audio, n_mels, padding=N_SAMPLES)
+
+
+def needs_fallback(result, compression_ratio_threshold=COMPRESSION_RATIO_THRESHOLD,
+                   logprob_threshold=LOGPROB_THRESHOLD, no_speech_threshold=NO_SPEECH_THRESHOLD):
+    """デコード結果が閾値を満たさず、次の温度で再デコードが必要か判定"""
+    fallback = False
+    if compression_ratio_threshold is not None and result.compression_ratio > compression_ratio_threshold:
+        fallback = True  # 繰り返しが多すぎる
+    if logprob_threshold is not None and result.avg_logprob < logprob_threshold:
+        fallback = True  # 平均対数確率が低すぎる
+    if no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold:
+        fallback = False  # 無音と判定された場合は再デコードしない
+    return fallback
+
+
+def decoding_options(language, temperature, prompt=None, beam_size=None):
+    """DecodingOptionsを生成（CPU実行のためfp16は無効）"""
+    return DecodingOptions(language=language, task="transcribe", temperature=temperature,
+                           prompt=prompt, beam_size=beam_size, fp16=False)
+
+
+def decode_with_fallback(model, mel_segment, language, prompt=None, attempts=DECODING_TIERS["accurate"],
+                         first_result=None):
+    """
+    閾値を満たすまで手順を変えながらデコード
+
+    Args:
+        model: Whisperモデル
+        mel_segment: (n_mels, N_FRAMES) のmel
+        language: 言語コード
+        prompt: 前の窓までのトークン
+        attempts: 試行する (温度, ビーム幅) の列
+        first_result: attempts[0] でのデコード結果（バッチ処理済みの場合）
+
+    Returns:
+        (DecodingResult, 再デコードした回数)
+    """
+    result = None
+    retries = 0
+    for i, (temperature, beam_size) in enumerate(attempts):
+        if i == 0 and first_result is not None:
+            result = first_result
+        else:
+            result = model.decode(mel_segment, decoding_options(language, temperature, prompt, beam_size))
+        retries = i
+        if not needs_fallback(result):
+            break
+    return result, retries
+
+
+def decode_first_windows(model, mels, language):
+    """
+    複数ファイルの最初の30秒窓をまとめて1回でデコード（温度0の貪欲法）
+
+    エンコーダーの順伝播とデコーダーのトークン生成をバッチで行います。
+    結果は transcribe_mel の first_result に渡すことで、
+    1ファイルずつ処理した場合と同じ出力になります。
+
+    Args:
+        model: Whisperモデル
+        mels: compute_mel で計算したmelのリスト
+        language: 言語コード
+
+    Returns:
+        ファイルごとのDecodingResultのリスト
+    """
+    # 30秒より短い音声でも、whisper.transcribe（requirements.txt の 20231117）と同じく
+    # compute_mel で付与した無音のmelを含めて30秒分を切り出す（無音のmelは0埋めとは値が異なる）
+    batch = torch.stack([whisper.pad_or_trim(mel[:, :N_FRAMES], N_FRAMES) for mel in mels]).to(model.device)
+    return model.decode(batch, decoding_options(language, DEFAULT_TEMPERATURES[0], prompt=[]))
+
+
+def transcribe_mel(model, mel, language, attempts=DECODING_TIERS["accurate"],
+                   condition_on_previous_text=True, initial_prompt=None, first_result=None):
+    """
+    log-melスペクトログラムから文字起こし
+
+    Args:
+        model: Whisperモデル
+        mel: compute_mel で計算したmel
+        language: 言語コード
+        attempts: 閾値を満たさない窓で試行する (温度, ビーム幅) の列（DECODING_TIERS の値）
+        condition_on_previous_text: 前の窓のテキストを次の窓のプロンプトに使う
+        initial_prompt: 最初の窓のプロンプトに使うテキスト（前のチャンクの文字起こしなど）
+        first_result: 最初の窓の attempts[0] でのデコード結果（バッチ処理済みの場合）。
+                      initial_prompt なしでデコードした結果を渡すこと
+
+    Returns:
+        whisper.transcribe と同じ形式の辞書（text, segments, language）。
+        各セグメントには窓を再デコードした回数（retries）が含まれる
+    """
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                              language=language, task="transcribe")
+    content_frames = mel.shape[-1] - N_FRAMES
+    input_stride = N_FRAMES // model.dims.n_audio_ctx
+    time_precision = input_stride * HOP_LENGTH / SAMPLE_RATE
+
+    seek = 0
+    all_tokens = []
+    all_segments = []
+    prompt_reset_since = 0
+
+    initial_prompt_tokens = []
+    if initial_prompt:
+        initial_prompt_tokens = tokenizer.encode(" " + initial_prompt.strip())
+        all_tokens.extend(initial_prompt_tokens)
+
+    def new_segment(start, end, tokens, result, retries):
+        tokens = tokens.tolist()
+        text_tokens = [token for token in tokens if token < tokenizer.eot]
+        return {
+            "seek": seek,
+            "start": start,
+            "end": end,
+            "text": tokenizer.decode(text_tokens),
+            "tokens": tokens,
+            "temperature": result.temperature,
+            "avg_logprob": result.avg_logprob,
+            "compression_ratio": result.compression_ratio,
+            "no_speech_prob": result.no_speech_prob,
+            "retries": retries,
+        }
+
+    while seek < content_frames:
+        time_offset = float(seek * HOP_LENGTH / SAMPLE_RATE)
+        segment_size = min(N_FRAMES, content_frames - seek)
+        segment_duration = segment_size * HOP_LENGTH / SAMPLE_RATE
+        # whisper 20231117 の transcribe と同じく、付与した無音のmelを含めて N_FRAMES 分を切り出す
+        # （segment_size で切ってから0埋めするのは 20240927 以降の動作）
+        mel_segment = whisper.pad_or_trim(mel[:, seek:seek + N_FRAMES], N_FRAMES).to(model.device)
+
+        result, retries = decode_with_fallback(
+            model, mel_segment, language,
+            prompt=all_tokens[prompt_reset_since:],
+            attempts=attempts,
+            first_result=first_result if seek == 0 else None
+        )
+        tokens = torch.tensor(result.tokens)
+
+        # 無音と判定された窓は飛ばす
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob <= LOGPROB_THRESHOLD:
+            seek += segment_size
+            continue
+
+        current_segments = []
+        timestamp_tokens = tokens.ge(tokenizer.timestamp_begin)
+        single_timestamp_ending = timestamp_tokens[-2:].tolist() == [False, True]
+        consecutive = torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0] + 1
+
+        if len(consecutive) > 0:
+            # タイムスタンプの区切りごとにセグメントを作る
+            slices = consecutive.tolist()
+            if single_timestamp_ending:
+                slices.append(len(tokens))
+
+            last_slice = 0
+            for current_slice in slices:
+                sliced_tokens = tokens[last_slice:current_slice]
+                start_pos = sliced_tokens[0].item() - tokenizer.timestamp_begin
+                end_pos = sliced_tokens[-1].item() - tokenizer.timestamp_begin
+                current_segments.append(new_segment(
+                    start=time_offset + start_pos * time_precision,
+                    end=time_offset + end_pos * time_precision,
+                    tokens=sliced_tokens,
+                    result=result,
+                    retries=retries
+                ))
+                last_slice = current_slice
+
+            if single_timestamp_ending:
+                seek += segment_size
+            else:
+                # 最後のタイムスタンプ位置から次の窓を始める
+                last_timestamp_pos = tokens[last_slice - 1].item() - tokenizer.timestamp_begin
+                seek += last_timestamp_pos * input_stride
+        else:
+            duration = segment_duration
+            timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+            if len(timestamps) > 0 and timestamps[-1].item() != tokenizer.timestamp_begin:
+                last_timestamp_pos = timestamps[-1].item() - tokenizer.timestamp_begin
+                duration = last_timestamp_pos * time_precision
+
+            current_segments.append(new_segment(
+                start=time_offset,
+                end=time_offset + duration,
+                tokens=tokens,
+                result=result,
+                retries=retries
+            ))
+            seek += segment_size
+
+        # 長さ0またはテキストのないセグメントは空にする
+        for segment in current_segments:
+            if segment["start"] == segment["end"] or segment["text"].strip() == "":
+                segment["text"] = ""
+                segment["tokens"] = []
+
+        all_segments.extend(
+            {"id": i, **segment}
+            for i, segment in enumerate(current_segments, start=len(all_segments))
+        )
+        all_tokens.extend(token for segment in current_segments for token in segment["tokens"])
+
+        if not condition_on_previous_text or result.temperature > 0.5:
+            prompt_reset_since = len(all_tokens)
+
+    return {
+        "text": tokenizer.decode(all_tokens[len(initial_prompt_tokens):]),
+        "segments": all_segments,
+        "language": language,
+    }
@@ -0,0 +1,246 @@
+"""
+文字起こしエンジン
+モデルの読み込み・入力の前処理・文字起こしをエンジンごとに実装します。
+どのエンジンも whisper.transcribe と同じ形式の結果（text, segments, language）を返すため、
+キュー・出力・処理済みファイルの記録はエンジンに依存しません。
+
+- whisper: openai-whisper（デフォルト）
+- faster-whisper: CTranslate2によるCPU向けの高速な実装（pip install faster-whisper が必要）
+
+unload でモデルの重みを解放でき、次に文字起こしする時点で読み込み直します。
+decode_first_windows は supports_batch が True のエンジンだけが持ちます（呼び出す側で確認する）。
+"""
+
+import gc
+import logging
+
+import whisper
+
+from decoding import DECODING_TIERS, compute_mel, decode_first_windows, transcribe_mel
+from quantization import DEFAULT_CACHE_DIR, load_quantized_model
+
+logger = logging.getLogger(__name__)
+
+ENGINE_NAMES = ("whisper", "faster-whisper")
+
+
+class WhisperEngine:
+    """openai-whisperのエンジン"""
+
+    name = "whisper"
+    supports_batch = True  # 最初の窓を複数ファイルまとめてデコードできる
+    supports_unload = True  # unload でモデルの重みを解放できる
+
+    def __init__(self, model_size, device=None, quantize="none", quantized_model_dir=None):
+        """
+        Args:
+            model_size: Whisperモデルのサイズ
+            device: 使用するデバイス（None で自動検出）
+            quantize: int8 の場合はLinear層をint8に動的量子化したモデルを使う（CPU専用）
+            quantized_model_dir: 量子化モデルの保存ディレクトリ（None で quantization.DEFAULT_CACHE_DIR）
+        """
+        self.model_size = model_size
+        self.device = device
+        self.quantize = quantize
+        self.quantized_model_dir = quantized_model_dir or DEFAULT_CACHE_DIR
+        self.model = None
+        self.load()
+        # melの計算に必要な値はモデルを解放しても使えるよう保持する
+        self.n_mels = self.model.dims.n_mels
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    def load(self):
+        """モデルを読み込む（読み込み済みなら何もしない）"""
+        if self.model is not None:
+            return
+        if self.quantize == "int8":
+            self.model = load_quantized_model(self.model_size, self.quantized_model_dir)
+        # M4 Proチップ対応のためdeviceを指定しない（自動検出）
+        elif self.device is None:
+            self.model = whisper.load_model(self.model_size)
+        else:
+            self.model = whisper.load_model(self.model_size, device=self.device)
+
+    def unload(self):
+        """モデルの重みを解放"""
+        self.model = None
+        gc.collect()
+
+    @property
+    def input_format(self):
+        """prepare の出力の形式（同じ値のエンジンどうしは前処理の結果を共有できる）"""
+        return ("mel", self.n_mels)
+
+    def prepare(self, audio):
+        """16kHzの音声配列からlog-melスペクトログラムを計算（モデルを読み込まずに行える）"""
+        return compute_mel(audio, self.n_mels)
+
+    def decode_first_windows(self, features, language):
+        """複数ファイルの最初の30秒窓をまとめてデコード（transcribe の first_result に渡す）"""
+        self.load()
+        return decode_first_windows(self.model, features, language)
+
+    def transcribe(self, features, language, attempts=DECODING_TIERS["accurate"], initial_prompt=None,
+                   first_result=None):
+        """
+        文字起こし
+
+        Args:
+            features: prepare の出力
+            language: 言語コード
+            attempts: 閾値を満たさない窓で試行する (温度, ビーム幅) の列
+            initial_prompt: 最初の窓のプロンプトに使うテキスト
+            first_result: decode_first_windows の結果
+
+        Returns:
+            whisper.transcribe と同じ形式の辞書
+        """
+        self.load()
+        return transcribe_mel(self.model, features, language, attempts=attempts,
+                              initial_prompt=initial_prompt, first_result=first_result)
+
+
+class FasterWhisperEngine:
+    """faster-whisper（CTranslate2）のエンジン"""
+
+    name = "faster-whisper"
+    supports_batch = False
+    supports_unload = True
+
+    def __init__(self, model_size, device=None, compute_type="int8", cpu_threads=0):
+        """
+        Args:
+            model_size: Whisperモデルのサイズ
+            device: 使用するデバイス（None で自動検出）
+            compute_type: CTranslate2の計算精度（CPUでは int8 が最も速い）
+            cpu_threads: CPUのスレッド数（0で自動）
+        """
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.model = None
+        self.load()
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    def load(self):
+        """モデルを読み込む（読み込み済みなら何もしない）"""
+        if self.model is not None:
+            return
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise ImportError("faster-whisperがインストールされていません: pip install faster-whisper") from e
+
+        self.model = WhisperModel(self.model_size, device=self.device or "auto", compute_type=self.compute_type,
+                                  cpu_threads=self.cpu_threads)
+
+    def unload(self):
+        """モデルの重みを解放"""
+        self.model = None
+        gc.collect()
+
+    @property
+    def input_format(self):
+        """prepare の出力の形式（melはエンジン内で計算する）"""
+        return ("audio",)
+
+    def prepare(self, audio):
+        """音声配列をそのまま渡す（melの計算は文字起こし時に行われる）"""
+        return audio
+
+    def transcribe(self, features, language, attempts=DECODING_TIERS["accurate"], initial_prompt=None,
+                   first_result=None):
+        """
+        文字起こし（引数は WhisperEngine.transcribe と同じ。first_result は使わない）
+
+        attempts は faster-whisper で表せる形（_fallback_options）に置き換えます。
+        """
+        self.load()
+        beam_size, temperatures = _fallback_options(attempts)
+
+        segments, info = self.model.transcribe(
+            features, language=language, task="transcribe",
+            beam_size=beam_size, best_of=1, temperature=temperatures,
+            initial_prompt=initial_prompt, vad_filter=False
+        )
+
+        results = []
+        for segment in segments:  # ジェネレーターなので読み出した時点でデコードされる
+            results.append({
+                "id": len(results),
+                "seek": segment.seek,
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "tokens": list(segment.tokens),
+                "temperature": segment.temperature,
+                "avg_logprob": segment.avg_logprob,
+                "compression_ratio": segment.compression_ratio,
+                "no_speech_prob": segment.no_speech_prob,
+                "retries": temperatures.index(segment.temperature) if segment.temperature in temperatures else 0,
+            })
+
+        return {
+            "text": "".join(segment["text"] for segment in results),
+            "segments": results,
+            "language": info.language,
+        }
+
+
+_warned_attempts = set()
+
+
+def _fallback_options(attempts):
+    """
+    attempts を faster-whisper の (ビーム幅, 温度の列) に置き換える
+
+    faster-whisperのビーム幅は最初の試行（温度0）にだけ使われ、再デコードは温度を上げたサンプリングになります。
+    そのため最初の試行のビーム幅（指定がなければ貪欲法）と、温度を上げていく再デコードだけを使い、
+    同じ温度でビーム幅だけを変える再デコード（balanced・fast のビームサーチ）は行いません。
+    """
+    beam_size = attempts[0][1] or 1
+    temperatures = [attempts[0][0]]
+    dropped = []
+    for temperature, beam in attempts[1:]:
+        if temperature <= temperatures[-1] or beam:
+            dropped.append((temperature, beam))
+            continue
+        temperatures.append(temperature)
+
+    key = tuple(tuple(attempt) for attempt in attempts)
+    if dropped and key not in _warned_attempts:
+        _warned_attempts.add(key)
+        logger.warning(f"faster-whisperで表せない再デコードの手順は行いません: {dropped} "
+                       f"(ビーム幅: {beam_size}, 温度: {temperatures})")
+    return beam_size, temperatures
+
+
+def load_engine(engine_name, model_size, device=None, quantize="none", quantized_model_dir=None,
+                compute_type="int8", cpu_threads=0):
+    """
+    設定に応じたエンジンを読み込む
+
+    Args:
+        engine_name: whisper または faster-whisper
+        model_size: Whisperモデルのサイズ
+        device: 使用するデバイス
+        quantize: whisperエンジンの量子化（none / int8）
+        quantized_model_dir: 量子化モデルの保存ディレクトリ
+        compute_type: faster-whisperエンジンの計算精度
+        cpu_threads: faster-whisperエンジンのCPUスレッド数
+
+    Returns:
+        エンジン
+    """
+    if engine_name == "faster-whisper":
+        return FasterWhisperEngine(model_size, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+    if engine_name == "whisper":
+        return WhisperEngine(model_size, device=device, quantize=quantize, quantized_model_dir=quantized_model_dir)
+    raise ValueError(f"不明なエンジンです: {engine_name}（{', '.join(ENGINE_NAMES)}）")
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+常駐推論デーモン
+Whisperモデルを読み込んだまま常駐し、Unixソケット経由で文字起こしの要求を受け付けます。
+transcriber.py は INFERENCE_SOCKET を設定するとモデルを読み込まずにこのデーモンへ処理を依頼するため、
+設定変更・異常終了・更新による transcriber.py の再起動でモデルを読み込み直す必要がなくなります。
+
+起動:
+    python inference_daemon.py [--socket ./.inference.sock] [--workers 1] [--preload medium]
+
+通信形式（1接続につき1要求）:
+    4バイト（ビッグエンディアン）のヘッダー長 + JSONヘッダー + ペイロード（ヘッダーの payload_bytes バイト）
+    transcribe 要求のペイロードは16kHzモノラルのfloat32音声配列です。
+"""
+
+import os
+import sys
+import json
+import socket
+import struct
+import logging
+import argparse
+import threading
+import socketserver
+from pathlib import Path
+
+import numpy as np
+import torch
+from dotenv import load_dotenv
+
+from engines import load_engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = Path(__file__).parent / '.inference.sock'
+
+_HEADER_LENGTH = struct.Struct('>I')
+
+
+def _recv_exactly(sock, size):
+    """size バイトを受信（途中で切断された場合はConnectionError）"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("接続が切断されました")
+        received += n
+    return bytes(buffer)
+
+
+def send_message(sock, header, payload=b""):
+    """ヘッダー（辞書）とペイロードを送信"""
+    header = dict(header, payload_bytes=len(payload))
+    data = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    sock.sendall(_HEADER_LENGTH.pack(len(data)) + data)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_message(sock):
+    """(ヘッダー, ペイロード) を受信"""
+    (length,) = _HEADER_LENGTH.unpack(_recv_exactly(sock, _HEADER_LENGTH.size))
+    header = json.loads(_recv_exactly(sock, length).decode('utf-8'))
+    payload = _recv_exactly(sock, header.get("payload_bytes", 0))
+    return header, payload
+
+
+class EnginePool:
+    """エンジンの設定ごとに、同時に使えるエンジンを最大 workers 個まで保持する"""
+
+    def __init__(self, workers, device=None, cpu_threads=0, quantized_model_dir=None):
+        self.workers = max(1, workers)
+        self.device = device
+        self.cpu_threads = cpu_threads
+        self.quantized_model_dir = quantized_model_dir
+        self.condition = threading.Condition()
+        self.idle = {}      # 設定 -> 空いているエンジンのリスト
+        self.created = {}   # 設定 -> 作成したエンジン数（読み込み中を含む）
+        self.failures = {}  # 設定 -> 読み込みに失敗した回数
+        self.errors = {}    # 設定 -> 最後の読み込みエラー
+
+    @staticmethod
+    def _key(spec):
+        return (spec["engine"], spec["model_size"], spec.get("quantize", "none"), spec.get("compute_type", "int8"))
+
+    def acquire(self, spec):
+        """
+        空いているエンジンを取り出す（なければ上限まで読み込み、上限に達していれば空くまで待つ）
+
+        Raises:
+            読み込みに失敗した場合はそのエラー（待っていた要求にも同じエラーを返す）
+        """
+        key = self._key(spec)
+        with self.condition:
+            while True:
+                idle = self.idle.setdefault(key, [])
+                if idle:
+                    return idle.pop()
+                # 読み込み中も他の設定の要求は処理できるよう、数だけ先に確保する
+                if self.created.get(key, 0) < self.workers:
+                    self.created[key] = self.created.get(key, 0) + 1
+                    break
+                failures = self.failures.get(key, 0)
+                self.condition.wait()
+                if self.failures.get(key, 0) != failures:
+                    # 待っている間に読み込みが失敗した（空くのを待ち続けないようにする）
+                    raise self.errors[key]
+
+        engine_name, model_size, quantize, compute_type = key
+        logger.info(f"Whisperモデル（{model_size}, エンジン: {engine_name}）を読み込み中...")
+        engine = None
+        error = None
+        try:
+            engine = load_engine(engine_name, model_size, device=self.device, quantize=quantize,
+                                 quantized_model_dir=self.quantized_model_dir,
+                                 compute_type=compute_type, cpu_threads=self.cpu_threads)
+            logger.info(f"Whisperモデル（{model_size}）の読み込み完了")
+            return engine
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if engine is None:
+                with self.condition:
+                    self.created[key] -= 1
+                    self.errors[key] = error or RuntimeError(f"Whisperモデル（{model_size}）の読み込みが中断されました")
+                    self.failures[key] = self.failures.get(key, 0) + 1
+                    self.condition.notify_all()
+
+    def release(self, spec, engine):
+        """使い終わったエンジンを戻す"""
+        with self.condition:
+            self.idle.setdefault(self._key(spec), []).append(engine)
+            self.condition.notify_all()
+
+    def status(self):
+        """読み込み済みのエンジンの一覧"""
+        with self.condition:
+            return [
+                {"engine": key[0], "model_size": key[1], "quantize": key[2], "compute_type": key[3],
+                 "loaded": count, "idle": len(self.idle.get(key, []))}
+                for key, count in self.created.items()
+            ]
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    """1接続分の要求を処理"""
+
+    def handle(self):
+        server = self.server
+        if server.torch_threads:
+            torch.set_num_threads(server.torch_threads)
+
+        try:
+            header, payload = recv_message(self.request)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"要求の受信エラー: {e}")
+            return
+
+        op = header.get("op")
+        try:
+            if op == "ping":
+                response = {"status": "ok", "pid": os.getpid(), "engines": server.pool.status()}
+            elif op == "load":
+                server.pool.release(header, server.pool.acquire(header))
+                response = {"status": "ok"}
+            elif op == "transcribe":
+                response = {"status": "ok", "result": self._transcribe(header, payload)}
+            else:
+                response = {"status": "error", "error": f"不明な要求です: {op}"}
+        except Exception as e:
+            logger.error(f"要求の処理エラー ({op}): {e}")
+            response = {"status": "error", "error": str(e)}
+
+        try:
+            send_message(self.request, response)
+        except OSError as e:
+            logger.warning(f"応答の送信エラー: {e}")
+
+    def _transcribe(self, header, payload):
+        audio = np.frombuffer(payload, dtype=np.float32)
+        attempts = tuple((temperature, beam_size) for temperature, beam_size in header["attempts"])
+
+        engine = self.server.pool.acquire(header)
+        try:
+            return engine.transcribe(engine.prepare(audio), header["language"], attempts=attempts,
+                                     initial_prompt=header.get("initial_prompt"))
+        finally:
+            self.server.pool.release(header, engine)
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """常駐推論サーバー"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, pool, torch_threads=0):
+        """
+        Args:
+            socket_path: Unixソケットのパス
+            pool: EnginePool
+            torch_threads: 要求を処理するスレッドごとのtorchスレッド数（0で変更しない）
+        """
+        self.socket_path = Path(socket_path)
+        self.pool = pool
+        self.torch_threads = torch_threads
+
+        # 前回異常終了した場合のソケットファイルを削除する
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        super().__init__(str(self.socket_path), _RequestHandler)
+        os.chmod(self.socket_path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+
+class RemoteEngine:
+    """
+    常駐推論デーモンに文字起こしを依頼するエンジン（engines.py のエンジンと同じインターフェース）
+
+    melの計算もデーモン側で行うため、音声配列をそのまま送ります。
+    要求ごとに接続するので、複数のワーカースレッドから同時に使えます。
+    """
+
+    name = "remote"
+    supports_batch = False
+    supports_unload = False  # モデルはデーモンが保持し続ける
+
+    def __init__(self, socket_path, model_size, engine="whisper", quantize="none", compute_type="int8",
+                 timeout=None):
+        """
+        Args:
+            socket_path: デーモンのUnixソケットのパス
+            model_size: Whisperモデルのサイズ
+            engine: デーモン側で使うエンジン（whisper / faster-whisper）
+            quantize: whisperエンジンの量子化（none / int8）
+            compute_type: faster-whisperエンジンの計算精度
+            timeout: 応答を待つ最大時間（秒、Noneで無制限）
+        """
+        self.socket_path = str(socket_path)
+        self.model_size = model_size
+        self.timeout = timeout
+        self.spec = {"engine": engine, "model_size": model_size, "quantize": quantize,
+                     "compute_type": compute_type}
+
+    @property
+    def input_format(self):
+        return ("audio",)
+
+    def _request(self, header, payload=b""):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            send_message(sock, header, payload)
+            response, _ = recv_message(sock)
+        if response.get("status") != "ok":
+            raise RuntimeError(f"推論デーモンのエラー: {response.get('error')}")
+        return response
+
+    @property
+    def loaded(self):
+        return True  # モデルはデーモンが保持する
+
+    def load(self):
+        """デーモンにモデルを読み込ませる（読み込み済みならすぐに戻る）"""
+        self._request(dict(self.spec, op="load"))
+
+    def unload(self):
+        """モデルはデーモンが保持し続ける（常駐させるのが目的のため解放しない）"""
+
+    def prepare(self, audio):
+        return np.ascontiguousarray(audio, dtype=np.float32)
+
+    def transcribe(self, features, language, attempts, initial_prompt=None, first_result=None):
+        """文字起こし（引数は engines.py のエンジンと同じ。first_result は使わない）"""
+        header = dict(self.spec, op="transcribe", language=language,
+                      attempts=[list(attempt) for attempt in attempts], initial_prompt=initial_prompt)
+        return self._request(header, features.tobytes())["result"]
+
+
+def main():
+    """コマンドライン処理"""
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Whisperモデルを常駐させて文字起こしの要求を受け付けます")
+    parser.add_argument("--socket", default=os.getenv('INFERENCE_SOCKET') or str(DEFAULT_SOCKET_PATH),
+                        help="Unixソケットのパス")
+    parser.add_argument("--workers", type=int, default=int(os.getenv('TRANSCRIBE_WORKERS', '1')),
+                        help="モデルごとに同時に処理する要求の数（読み込むモデルの数）")
+    parser.add_argument("--threads", type=int, default=int(os.getenv('TORCH_THREADS_PER_WORKER', '0')),
+                        help="要求ごとのtorchスレッド数（0で自動）")
+    parser.add_argument("--preload", default=os.getenv('WHISPER_MODEL_SIZE', 'medium'),
+                        help="起動時に読み込むモデルのサイズ（空で読み込まない）")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    workers = max(1, args.workers)
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+    quantized_model_dir = Path(os.getenv('QUANTIZED_MODEL_DIR', './models'))
+    if not quantized_model_dir.is_absolute():
+        quantized_model_dir = (Path(__file__).parent / quantized_model_dir).resolve()
+    pool = EnginePool(workers, cpu_threads=threads, quantized_model_dir=quantized_model_dir)
+
+    if args.preload:
+        spec = {"engine": os.getenv('TRANSCRIBE_ENGINE', 'whisper').lower(), "model_size": args.preload,
+                "quantize": os.getenv('WHISPER_QUANTIZE', 'none').lower(),
+                "compute_type": os.getenv('FASTER_WHISPER_COMPUTE_TYPE', 'int8')}
+        try:
+            pool.release(spec, pool.acquire(spec))
+        except Exception as e:
+            logger.error(f"Whisperモデルの読み込みに失敗しました: {e}")
+            sys.exit(1)
+
+    server = InferenceServer(args.socket, pool, torch_threads=threads)
+    logger.info(f"推論デーモンを起動しました: {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("終了シグナルを受信しました")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
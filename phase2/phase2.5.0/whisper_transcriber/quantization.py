@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Whisperモデルのint8動的量子化
+Linear層の重みをint8に量子化したモデルを作成し、ディスクにキャッシュします（CPU専用）。
+
+量子化モデルと通常のモデルの文字起こし結果の比較:
+    python quantization.py compare --model medium --language ja recording1.wav recording2.wav
+"""
+
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+import torch
+import whisper
+from whisper.audio import SAMPLE_RATE
+
+from audio_utils import UnsupportedWavFormat, load_wav
+from decoding import compute_mel, transcribe_mel
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / 'models'
+
+
+def quantize_model(model):
+    """
+    モデルのLinear層をint8に動的量子化
+
+    Args:
+        model: CPU上のWhisperモデル
+
+    Returns:
+        量子化したモデル
+    """
+    # whisper独自のLinear（入力のdtypeに重みを合わせるだけ）はfp32では
+    # torch.nn.Linearと同じ動作なので、量子化の対象になるよう置き換える
+    for module in model.modules():
+        if isinstance(module, whisper.model.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def cache_path(model_size, cache_dir=DEFAULT_CACHE_DIR):
+    """量子化モデルのキャッシュファイルのパス（torchのバージョンごとに分ける）"""
+    return Path(cache_dir) / f"whisper-{model_size}-int8-torch{torch.__version__}.pt"
+
+
+def load_quantized_model(model_size, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    量子化モデルを読み込む（キャッシュがなければ作成して保存）
+
+    Args:
+        model_size: Whisperモデルのサイズ
+        cache_dir: 量子化モデルの保存ディレクトリ
+
+    Returns:
+        量子化したWhisperモデル
+    """
+    path = cache_path(model_size, cache_dir)
+    if path.exists():
+        try:
+            model = torch.load(path, map_location="cpu", weights_only=False)
+            logger.info(f"量子化モデルをキャッシュから読み込みました: {path.name}")
+            return model.eval()
+        except Exception as e:
+            logger.warning(f"量子化モデルのキャッシュを読み込めませんでした（作り直します）: {e}")
+
+    logger.info(f"Whisperモデル（{model_size}）をint8に量子化中...")
+    model = quantize_model(whisper.load_model(model_size, device="cpu")).eval()
+
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        torch.save(model, tmp_path)
+        tmp_path.replace(path)
+        logger.info(f"量子化モデルを保存しました: {path}")
+    except OSError as e:
+        logger.warning(f"量子化モデルの保存に失敗しました: {e}")
+    return model
+
+
+def character_error_rate(reference, hypothesis):
+    """文字誤り率（編集距離 / 基準テキストの文字数）"""
+    reference = reference.replace(" ", "")
+    hypothesis = hypothesis.replace(" ", "")
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, start=1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_char != hyp_char)
+            ))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def _transcribe(model, audio, language):
+    """文字起こしを行い、(テキスト, 処理時間) を返す"""
+    start_time = time.time()
+    result = transcribe_mel(model, compute_mel(audio, model.dims.n_mels), language)
+    return result["text"].strip(), time.time() - start_time
+
+
+def compare(model_size, language, audio_paths, cache_dir=DEFAULT_CACHE_DIR):
+    """量子化モデルと通常のモデルで同じファイルを文字起こしし、結果を比較"""
+    float_model = whisper.load_model(model_size, device="cpu")
+    quantized_model = load_quantized_model(model_size, cache_dir)
+
+    total_float = total_quantized = 0.0
+    error_rates = []
+    for audio_path in audio_paths:
+        try:
+            audio = load_wav(audio_path, SAMPLE_RATE)
+        except UnsupportedWavFormat:
+            audio = whisper.load_audio(str(audio_path))
+
+        float_text, float_time = _transcribe(float_model, audio, language)
+        quantized_text, quantized_time = _transcribe(quantized_model, audio, language)
+        cer = character_error_rate(float_text, quantized_text)
+
+        total_float += float_time
+        total_quantized += quantized_time
+        error_rates.append(cer)
+        logger.info(f"{Path(audio_path).name}: CER {cer:.3f} "
+                    f"(float: {float_time:.2f}秒, int8: {quantized_time:.2f}秒)")
+        if cer > 0:
+            logger.info(f"  float: {float_text}")
+            logger.info(f"  int8 : {quantized_text}")
+
+    if error_rates:
+        logger.info(f"平均CER: {sum(error_rates) / len(error_rates):.3f} / "
+                    f"処理時間 float: {total_float:.2f}秒, int8: {total_quantized:.2f}秒")
+
+
+def main():
+    """コマンドライン処理"""
+    parser = argparse.ArgumentParser(description="Whisperモデルのint8量子化")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compare_parser = subparsers.add_parser("compare", help="量子化モデルと通常のモデルの結果を比較")
+    compare_parser.add_argument("files", nargs="+", help="比較に使う音声ファイル")
+    compare_parser.add_argument("--model", default="medium", help="Whisperモデルのサイズ")
+    compare_parser.add_argument("--language", default="ja", help="言語コード")
+    compare_parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="量子化モデルの保存ディレクトリ")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "compare":
+        missing = [f for f in args.files if not Path(f).exists()]
+        if missing:
+            logger.error(f"ファイルが存在しません: {missing}")
+            sys.exit(1)
+        compare(args.model, args.language, args.files, Path(args.cache_dir))
+
+
+if __name__ == "__main__":
+    main()
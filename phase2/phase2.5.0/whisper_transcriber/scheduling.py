@@ -0,0 +1,156 @@
+"""
+文字起こしキューのスケジューラー
+優先度クラス（録音直後のファイル → 既存ファイル）ごとに並べ替えて取り出します。
+"""
+
+import time
+import heapq
+import queue
+import threading
+from dataclasses import dataclass, field
+
+# 優先度クラス（値が小さいほど先に処理する）
+PRIORITY_LIVE = 0       # 録音されたばかりのファイル
+PRIORITY_BACKFILL = 1   # 起動時に見つかった未処理の既存ファイル
+
+PRIORITY_NAMES = {PRIORITY_LIVE: "live", PRIORITY_BACKFILL: "backfill"}
+
+
+@dataclass(order=True)
+class _Entry:
+    priority: int
+    sort_key: float
+    counter: int
+    item: object = field(compare=False)
+    name: str = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    deadline: float = field(compare=False)
+
+
+class TranscriptionScheduler:
+    """優先度・期限つきの有界キュー"""
+
+    def __init__(self, capacity):
+        """
+        Args:
+            capacity: キューに保持するファイル数の上限。
+                      既存ファイル（PRIORITY_BACKFILL）はこの数を超えると追加側を待たせる。
+                      録音直後のファイル（PRIORITY_LIVE）は常に受け付ける。
+        """
+        self.capacity = capacity
+        self.heap = []
+        self.counter = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def put(self, item, priority, sort_key, deadline=None, name="", block=True, timeout=None):
+        """
+        キューに追加
+
+        Args:
+            item: 追加する要素
+            priority: 優先度クラス
+            sort_key: 同じ優先度クラス内での並び順（小さいほど先）
+            deadline: 処理期限（時刻）。状態表示で期限切れの数を数えるのに使う
+            name: 状態表示用の名前
+            block: 上限に達している場合に空きが出るまで待つ
+            timeout: 待つ最大時間（秒）
+
+        Raises:
+            queue.Full: 上限に達していて追加できなかった場合
+        """
+        with self.condition:
+            if priority != PRIORITY_LIVE:
+                if not self.condition.wait_for(
+                    lambda: len(self.heap) < self.capacity or self.closed,
+                    timeout=timeout if block else 0
+                ):
+                    raise queue.Full
+            if self.closed:
+                return
+
+            heapq.heappush(self.heap, _Entry(
+                priority=priority,
+                sort_key=sort_key,
+                counter=self.counter,
+                item=item,
+                name=name,
+                enqueued_at=time.time(),
+                deadline=deadline
+            ))
+            self.counter += 1
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        """
+        最も優先度の高い要素を取り出す
+
+        Returns:
+            要素。停止済みで残っている要素がない場合はNone
+
+        Raises:
+            queue.Empty: timeout までに要素がなかった場合
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.heap or self.closed, timeout=timeout):
+                raise queue.Empty
+            if not self.heap:
+                return None
+
+            entry = heapq.heappop(self.heap)
+            self.condition.notify_all()  # 待っている追加側を起こす
+            return entry.item
+
+    def qsize(self):
+        """キューに残っている要素数"""
+        with self.condition:
+            return len(self.heap)
+
+    def close(self, drain=False):
+        """
+        停止（以降の追加は受け付けず、待機中の get/put を返す）
+
+        Args:
+            drain: Trueの場合、録音直後のファイル（PRIORITY_LIVE）は残し、取り出し終えてから get がNoneを返す。
+                   既存ファイルは破棄する（次回起動時に既存ファイルとして見つかるため）。
+                   Falseの場合は残っている要素をすべて破棄する
+        """
+        with self.condition:
+            self.closed = True
+            if drain:
+                self.heap = [entry for entry in self.heap if entry.priority == PRIORITY_LIVE]
+                heapq.heapify(self.heap)
+            else:
+                self.heap.clear()
+            self.condition.notify_all()
+
+    def snapshot(self, preview=5):
+        """
+        キューの状態を取得
+
+        Args:
+            preview: 次に処理される要素を何件まで含めるか
+
+        Returns:
+            状態を表す辞書
+        """
+        now = time.time()
+        with self.condition:
+            entries = list(self.heap)
+
+        by_priority = {}
+        for entry in entries:
+            name = PRIORITY_NAMES.get(entry.priority, str(entry.priority))
+            stats = by_priority.setdefault(name, {"count": 0, "oldest_wait_sec": 0.0, "overdue": 0})
+            stats["count"] += 1
+            stats["oldest_wait_sec"] = round(max(stats["oldest_wait_sec"], now - entry.enqueued_at), 1)
+            if entry.deadline is not None and now > entry.deadline:
+                stats["overdue"] += 1
+
+        return {
+            "updated_at": now,
+            "capacity": self.capacity,
+            "size": len(entries),
+            "by_priority": by_priority,
+            "next": [entry.name for entry in heapq.nsmallest(preview, entries)],
+        }
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+タイムスタンプつきセグメントの保存と読み込み
+文字起こしのセグメント（開始・終了時刻、テキスト、平均対数確率）を
+テキストファイルと同じ場所にJSONL形式（1行1セグメント、時刻順）で保存します。
+
+読み込み例:
+    from segment_store import SegmentReader
+
+    reader = SegmentReader("recording-20250101-120000.segments.jsonl")
+    reader.at(42.0)             # 42秒の時点で話されているセグメント
+    reader.between(60.0, 90.0)  # 60〜90秒に重なるセグメント
+
+セグメントの表示:
+    python segment_store.py recording-20250101-120000.segments.jsonl [--start 60] [--end 90]
+"""
+
+import os
+import json
+import bisect
+import argparse
+from pathlib import Path
+
+SEGMENTS_SUFFIX = ".segments.jsonl"
+
+
+def segments_path(text_path):
+    """テキストファイルに対応するセグメントファイルのパス"""
+    text_path = Path(text_path)
+    return text_path.with_name(text_path.stem + SEGMENTS_SUFFIX)
+
+
+def write_segments(path, segments):
+    """
+    セグメントをJSONL形式で保存（一時ファイルに書いてから置き換える）
+
+    Args:
+        path: 保存先のパス
+        segments: Whisperのセグメントのリスト（start, end, text, avg_logprob, retries を使う）
+    """
+    path = Path(path)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for segment in sorted(segments, key=lambda segment: segment["start"]):
+            record = {
+                "start": round(segment["start"], 2),
+                "end": round(segment["end"], 2),
+                "text": segment["text"].strip(),
+                "avg_logprob": round(segment.get("avg_logprob", 0.0), 3),
+            }
+            if segment.get("retries"):
+                record["retries"] = segment["retries"]  # 窓を再デコードした回数
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+
+
+class SegmentReader:
+    """セグメントファイルを読み込み、時刻で検索するクラス"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path: セグメントファイル（.segments.jsonl）のパス
+        """
+        self.path = Path(path)
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.segments = [json.loads(line) for line in f if line.strip()]
+        self.starts = [segment["start"] for segment in self.segments]
+
+        # 各セグメントまでの最大の終了時刻（重なりのあるセグメントも検索できるようにする）
+        self.max_ends = []
+        max_end = float("-inf")
+        for segment in self.segments:
+            max_end = max(max_end, segment["end"])
+            self.max_ends.append(max_end)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __iter__(self):
+        return iter(self.segments)
+
+    def between(self, start, end):
+        """
+        [start, end) の区間に重なるセグメントを取得
+
+        Args:
+            start: 開始時刻（秒）
+            end: 終了時刻（秒）
+
+        Returns:
+            時刻順のセグメントのリスト
+        """
+        first = bisect.bisect_right(self.max_ends, start)
+        last = bisect.bisect_left(self.starts, end)
+        return [segment for segment in self.segments[first:last] if segment["end"] > start]
+
+    def at(self, time_sec):
+        """
+        指定した時刻に話されているセグメントを取得
+
+        Returns:
+            セグメント。該当するものがない場合は直前のセグメント（先頭より前ならNone）
+        """
+        index = bisect.bisect_right(self.starts, time_sec) - 1
+        if index < 0:
+            return None
+        return self.segments[index]
+
+    def find(self, text):
+        """
+        テキストを含む最初のセグメントを取得（抽出したタスクを音声の位置に対応づけるのに使う）
+
+        Returns:
+            セグメント。見つからない場合はNone
+        """
+        for segment in self.segments:
+            if text in segment["text"]:
+                return segment
+        return None
+
+
+def main():
+    """コマンドライン処理"""
+    parser = argparse.ArgumentParser(description="セグメントファイルを表示します")
+    parser.add_argument("path", help="セグメントファイルのパス")
+    parser.add_argument("--start", type=float, default=0.0, help="表示を始める時刻（秒）")
+    parser.add_argument("--end", type=float, default=float("inf"), help="表示を終える時刻（秒）")
+    args = parser.parse_args()
+
+    for segment in SegmentReader(args.path).between(args.start, args.end):
+        print(f"[{segment['start']:.2f}s - {segment['end']:.2f}s] {segment['text']}")
+
+
+if __name__ == "__main__":
+    main()
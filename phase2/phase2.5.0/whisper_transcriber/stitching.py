@@ -0,0 +1,90 @@
+"""
+チャンク境界のつなぎ合わせ
+前のチャンクと重ねてデコードした部分の重複を取り除き、
+分割して文字起こしした区間の結果を1つにまとめます。
+"""
+
+
+def drop_overlap_segments(segments, boundary=0.0):
+    """
+    boundary（秒）より前で終わるセグメントを取り除く
+
+    前のチャンクの末尾を重ねてデコードした場合、その部分のセグメントは
+    前のチャンクの文字起こしに含まれているため不要です。
+    境界をまたぐセグメントは、途中で切れていた単語を含むので残します。
+
+    Args:
+        segments: タイムスタンプがこのチャンクの先頭基準のセグメントのリスト
+        boundary: このチャンク自身の音声が始まる位置（秒）
+
+    Returns:
+        残したセグメントのリスト
+    """
+    kept = []
+    for segment in segments:
+        if segment["end"] <= boundary:
+            continue
+        kept.append({**segment, "start": max(segment["start"], boundary)})
+    return kept
+
+
+def dedupe_prefix(previous_text, text, max_chars=50, min_chars=3):
+    """
+    前のテキストの末尾と一致するtextの先頭部分を取り除く
+
+    Args:
+        previous_text: 前のチャンクの文字起こし
+        text: このチャンクの文字起こし
+        max_chars: 一致を探す最大文字数
+        min_chars: これより短い一致は偶然とみなして取り除かない
+
+    Returns:
+        重複を取り除いたテキスト
+    """
+    previous = previous_text.rstrip()
+    current = text.lstrip()
+    for length in range(min(len(previous), len(current), max_chars), min_chars - 1, -1):
+        if previous.endswith(current[:length]):
+            return current[length:].lstrip()
+    return current
+
+
+def merge_span_results(results, starts=None):
+    """
+    分割して文字起こしした区間の結果を時刻順に連結する
+
+    区間の境界をまたぐセグメントは前後両方の区間の結果に現れることがあるため、
+    starts を指定した場合は、開始時刻を含む区間のセグメントだけを残します。
+    前の区間から境界をまたいだセグメントと重なる、後の区間のセグメントは同じ発話なので除きます。
+
+    Args:
+        results: 区間の順に並んだ結果の辞書（segmentsのタイムスタンプはファイル先頭基準）
+        starts: 各区間の先頭のファイル上の位置（秒）
+
+    Returns:
+        1つにまとめた結果の辞書
+    """
+    segments = []
+    texts = []
+    previous_end = float("-inf")
+    for i, result in enumerate(results):
+        if starts is None:
+            kept = result["segments"]
+            texts.append(result["text"])
+        else:
+            # 最初の区間より前・最後の区間より後のセグメントは、それぞれ最初・最後の区間に含める
+            low = max(starts[i], previous_end) if i > 0 else float("-inf")
+            high = starts[i + 1] if i + 1 < len(starts) else float("inf")
+            kept = [segment for segment in result["segments"] if low <= segment["start"] < high]
+            texts.append("".join(segment["text"] for segment in kept))
+            if kept:
+                previous_end = kept[-1]["end"]
+        segments.extend(kept)
+    segments.sort(key=lambda segment: segment["start"])
+    for i, segment in enumerate(segments):
+        segment["id"] = i
+    return {
+        "text": "".join(texts),
+        "segments": segments,
+        "language": results[0].get("language") if results else None,
+    }
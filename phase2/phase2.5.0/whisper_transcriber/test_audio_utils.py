@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+audio_utils.py のテスト
+
+実行:
+    python -m pytest test_audio_utils.py
+"""
+
+import sys
+import wave
+
+import numpy as np
+import pytest
+
+from audio_utils import find_split_points, find_wav_split_points, load_wav
+
+SAMPLE_RATE = 16000
+
+
+def _write_wav(path, seconds, sample_rate=44100, seed=0):
+    """発話（正弦波）と無音が交互に続く16bit PCM WAVを書き出す"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    voiced = np.sin(2 * np.pi * 0.13 * t) > 0
+    audio = 0.3 * np.sin(2 * np.pi * 200 * t) * voiced + 0.001 * rng.standard_normal(len(t))
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes((audio * 32767).astype("<i2").tobytes())
+
+
+@pytest.mark.parametrize("window_sec", [37.0, 120.0])
+def test_wav_split_points_match_in_memory_split(tmp_path, window_sec):
+    """区間ごとに読み込んで探した分割位置が、一括で読み込んだ場合と同じになる"""
+    path = tmp_path / "long.wav"
+    _write_wav(path, 200)
+
+    expected = [point / SAMPLE_RATE for point in find_split_points(load_wav(path, SAMPLE_RATE), SAMPLE_RATE, 60)]
+    actual = find_wav_split_points(path, 60, window_sec=window_sec, target_rate=SAMPLE_RATE)
+
+    assert len(expected) == 3
+    assert actual == pytest.approx(expected, abs=0.05)
+
+
+def test_short_wav_is_not_split(tmp_path):
+    """区間1つ分に満たないWAVは分割しない"""
+    path = tmp_path / "short.wav"
+    _write_wav(path, 50)
+
+    assert find_wav_split_points(path, 60, window_sec=30.0, target_rate=SAMPLE_RATE) == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+decoding.py と whisper.transcribe の結果の一致を確認するテスト
+VADで切り出した30秒未満のチャンクでも、最後の窓の入力が whisper.transcribe と同じになることを確認します。
+
+実行（初回はtinyモデルをダウンロードします）:
+    python -m pytest test_decoding.py
+
+実際の録音で確認する場合:
+    WHISPER_PARITY_AUDIO=recording.wav python -m pytest test_decoding.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+whisper = pytest.importorskip("whisper")
+pytest.importorskip("torch")
+
+from whisper.audio import SAMPLE_RATE
+
+from decoding import compute_mel, decode_first_windows, transcribe_mel
+
+LANGUAGE = "ja"
+
+
+@pytest.fixture(scope="module")
+def model():
+    return whisper.load_model(os.getenv("WHISPER_PARITY_MODEL", "tiny"), device="cpu")
+
+
+def _short_clip(seconds=8.0, seed=0):
+    """30秒未満のテスト用音声（WHISPER_PARITY_AUDIO が指定されていればその先頭）"""
+    path = os.getenv("WHISPER_PARITY_AUDIO")
+    if path:
+        return whisper.load_audio(path)[:int(seconds * SAMPLE_RATE)]
+
+    # 音声がない環境でも決定的に結果が出るよう、振幅の変わる複数の音と雑音を合成する
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    audio = envelope * (0.3 * np.sin(2 * np.pi * 220 * t) + 0.2 * np.sin(2 * np.pi * 330 * t))
+    audio += 0.05 * rng.standard_normal(len(t))
+    return audio.astype(np.float32)
+
+
+def _comparable(result):
+    return result["text"], [(s["start"], s["end"], s["text"]) for s in result["segments"]]
+
+
+def test_transcribe_mel_matches_whisper_transcribe_on_short_clip(model):
+    """30秒未満のチャンクで whisper.transcribe と同じ結果になる"""
+    audio = _short_clip()
+    expected = model.transcribe(audio, language=LANGUAGE, fp16=False)
+    actual = transcribe_mel(model, compute_mel(audio, model.dims.n_mels), LANGUAGE)
+
+    assert _comparable(actual) == _comparable(expected)
+
+
+def test_batched_first_window_matches_whisper_transcribe(model):
+    """最初の窓をバッチでデコードした結果を使っても whisper.transcribe と同じ結果になる"""
+    clips = [_short_clip(8.0, seed=0), _short_clip(5.0, seed=1)]
+    mels = [compute_mel(audio, model.dims.n_mels) for audio in clips]
+    first_results = decode_first_windows(model, mels, LANGUAGE)
+
+    for audio, mel, first_result in zip(clips, mels, first_results):
+        expected = model.transcribe(audio, language=LANGUAGE, fp16=False)
+        actual = transcribe_mel(model, mel, LANGUAGE, first_result=first_result)
+        assert _comparable(actual) == _comparable(expected)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
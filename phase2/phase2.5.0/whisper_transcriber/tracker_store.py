@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+処理済みファイルの記録（SQLite）
+パス・サイズ・更新日時・内容のハッシュをキーに処理結果を記録します。
+
+圧縮（不要になった領域の解放）:
+    python tracker_store.py compact [--prune-missing] [DBファイル]
+"""
+
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent / '.processed_files.db'
+LEGACY_JSON_PATH = Path(__file__).parent / '.processed_files.json'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    content_hash TEXT,
+    status TEXT NOT NULL,
+    model TEXT,
+    processed_at REAL NOT NULL
+)
+"""
+
+
+def file_hash(filepath, block_size=1 << 20):
+    """ファイル内容のハッシュ（blake2b, 128bit）"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ProcessedFilesTracker:
+    """処理済みファイルを追跡するクラス"""
+
+    def __init__(self, filepath=DEFAULT_DB_PATH, legacy_json_path=LEGACY_JSON_PATH):
+        """
+        Args:
+            filepath: SQLiteデータベースのパス
+            legacy_json_path: 旧形式（.processed_files.json）のパス。DBが空の場合に取り込む
+        """
+        self.filepath = Path(filepath)
+        self.lock = threading.Lock()  # 複数ワーカーからの同時更新を防ぐ
+
+        # 書き込みはWAL（追記）で行い、異常終了時もコミット済みの記録は失われない
+        self.conn = sqlite3.connect(str(self.filepath), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(processed_files)")}
+        if "model" not in columns:
+            self.conn.execute("ALTER TABLE processed_files ADD COLUMN model TEXT")
+        self.conn.commit()
+
+        if legacy_json_path is not None:
+            self._import_legacy(Path(legacy_json_path))
+
+    def _import_legacy(self, json_path):
+        """旧形式の処理済みファイルリストを取り込む"""
+        if not json_path.exists():
+            return
+        if self.conn.execute("SELECT 1 FROM processed_files LIMIT 1").fetchone():
+            return
+
+        try:
+            with open(json_path, 'r') as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                data = {path: "transcribed" for path in data}
+
+            now = time.time()
+            with self.lock, self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO processed_files (path, status, processed_at) VALUES (?, ?, ?)",
+                    [(path, status, now) for path, status in data.items()]
+                )
+            logger.info(f"旧形式の処理済みファイルリストを取り込みました: {len(data)}件")
+        except Exception as e:
+            logger.error(f"処理済みファイルリストの読み込みエラー: {e}")
+
+    def _lookup(self, filepath):
+        """記録されている処理結果を取得（ファイルが変更されている場合はNone）"""
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, content_hash, status FROM processed_files WHERE path = ?",
+            (str(filepath),)
+        ).fetchone()
+        if row is None:
+            return None
+
+        size, mtime_ns, content_hash, status = row
+        if size is None:
+            return status  # 旧形式から取り込んだ記録はパスのみで判定
+
+        try:
+            stat = Path(filepath).stat()
+        except OSError:
+            return status  # ファイルが削除されていても記録は有効
+
+        if stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+            return status
+
+        # 更新日時だけが変わった場合は内容のハッシュで確認する
+        if stat.st_size == size and content_hash and file_hash(filepath) == content_hash:
+            self.conn.execute(
+                "UPDATE processed_files SET mtime_ns = ? WHERE path = ?",
+                (stat.st_mtime_ns, str(filepath))
+            )
+            self.conn.commit()
+            return status
+        return None
+
+    def is_processed(self, filepath):
+        """ファイルが処理済みかチェック"""
+        return self.get_status(filepath) is not None
+
+    def get_status(self, filepath):
+        """処理結果を取得（未処理の場合はNone）"""
+        with self.lock:
+            return self._lookup(filepath)
+
+    def get_model(self, filepath):
+        """文字起こしに使用したモデルを取得"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT model FROM processed_files WHERE path = ?", (str(filepath),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def mark_as_processed(self, filepath, status="transcribed", model=None):
+        """ファイルを処理済みとしてマーク"""
+        try:
+            stat = Path(filepath).stat()
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            content_hash = file_hash(filepath)
+        except OSError:
+            size = mtime_ns = content_hash = None
+
+        try:
+            with self.lock, self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO processed_files "
+                    "(path, size, mtime_ns, content_hash, status, model, processed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (str(filepath), size, mtime_ns, content_hash, status, model, time.time())
+                )
+        except sqlite3.Error as e:
+            logger.error(f"処理済みファイルリストの保存エラー: {e}")
+
+    def compact(self, prune_missing=False):
+        """
+        データベースを圧縮
+
+        Args:
+            prune_missing: 存在しなくなったファイルの記録を削除する
+
+        Returns:
+            削除した記録の件数
+        """
+        removed = 0
+        with self.lock:
+            if prune_missing:
+                paths = [row[0] for row in self.conn.execute("SELECT path FROM processed_files")]
+                missing = [(path,) for path in paths if not Path(path).exists()]
+                with self.conn:
+                    self.conn.executemany("DELETE FROM processed_files WHERE path = ?", missing)
+                removed = len(missing)
+
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.execute("VACUUM")
+        return removed
+
+    def close(self):
+        """データベースを閉じる"""
+        with self.lock:
+            self.conn.close()
+
+
+def main():
+    """コマンドライン処理"""
+    parser = argparse.ArgumentParser(description="処理済みファイルの記録を管理します")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compact_parser = subparsers.add_parser("compact", help="データベースを圧縮")
+    compact_parser.add_argument("db", nargs="?", default=str(DEFAULT_DB_PATH), help="DBファイルのパス")
+    compact_parser.add_argument("--prune-missing", action="store_true",
+                                help="存在しなくなったファイルの記録を削除")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "compact":
+        db_path = Path(args.db)
+        if not db_path.exists():
+            logger.error(f"DBファイルが存在しません: {db_path}")
+            sys.exit(1)
+
+        tracker = ProcessedFilesTracker(db_path, legacy_json_path=None)
+        before = db_path.stat().st_size
+        removed = tracker.compact(prune_missing=args.prune_missing)
+        tracker.close()
+        logger.info(f"圧縮完了: {before} → {db_path.stat().st_size} バイト (削除した記録: {removed}件)")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,15 +9,33 @@ import sys
 import time
 import logging
 import json
+from collections import Counter
 from pathlib import Path
 from datetime import datetime
+from dataclasses import dataclass, field
+import numpy as np
+import torch
 import whisper
+from whisper.audio import N_SAMPLES, SAMPLE_RATE
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import queue
 import threading
 from dotenv import load_dotenv
 
+from audio_utils import (
+    UnsupportedWavFormat, find_speech_region, find_split_points, find_wav_split_points, load_wav, pcm_hash,
+    read_wav_window, wav_duration, wav_is_complete
+)
+from decoding import DECODING_TIERS
+from engines import ENGINE_NAMES, load_engine
+from inference_daemon import RemoteEngine
+from tracker_store import ProcessedFilesTracker
+from transcript_cache import TranscriptCache
+from scheduling import PRIORITY_BACKFILL, PRIORITY_LIVE, PRIORITY_NAMES, TranscriptionScheduler
+from segment_store import segments_path, write_segments
+from stitching import dedupe_prefix, drop_overlap_segments, merge_span_results
+
 # .envファイルの読み込み
 load_dotenv()
 
@@ -46,10 +64,133 @@ if not LOG_DIR.is_absolute():
 WHISPER_MODEL_SIZE = os.getenv('WHISPER_MODEL_SIZE', 'medium')
 WHISPER_LANGUAGE = os.getenv('WHISPER_LANGUAGE', 'ja')
 
+# 文字起こしエンジン設定
+# TRANSCRIBE_ENGINE: whisper（openai-whisper）または faster-whisper（CTranslate2, pip install faster-whisper が必要）
+# FASTER_WHISPER_COMPUTE_TYPE: faster-whisperの計算精度（int8, int8_float32, float32 など）
+TRANSCRIBE_ENGINE = os.getenv('TRANSCRIBE_ENGINE', 'whisper').lower()
+FASTER_WHISPER_COMPUTE_TYPE = os.getenv('FASTER_WHISPER_COMPUTE_TYPE', 'int8')
+
+# 常駐推論デーモン設定
+# INFERENCE_SOCKET: inference_daemon.py のUnixソケットのパス。設定するとモデルを読み込まずにデーモンへ処理を依頼する
+INFERENCE_SOCKET = os.getenv('INFERENCE_SOCKET', '')
+
+# アイドル時のモデル解放設定
+# MODEL_IDLE_UNLOAD_SEC: 文字起こしがこの秒数行われなかったらモデルの重みを解放する（0で常に保持）
+#   次のファイルが届いた時点、または新しい録音ファイルの作成を検出した時点で読み込み直す
+MODEL_IDLE_UNLOAD_SEC = float(os.getenv('MODEL_IDLE_UNLOAD_SEC', '0'))
+MODEL_RELOAD_RETRY_SEC = 10.0  # 読み込み直しに失敗した場合に再試行するまでの秒数（失敗するたびに倍にする）
+MODEL_RELOAD_MAX_RETRIES = 5   # この回数続けて読み込めなければ、取り出したファイルを失敗として確定する
+
+# デコード設定
+# DECODE_TIER: accurate（whisper.transcribeと同じ温度フォールバック）/ balanced / fast
+#   balanced・fastは温度0の貪欲法でデコードし、閾値を満たさない窓だけビームサーチなどで再デコードする
+DECODE_TIER = os.getenv('DECODE_TIER', 'accurate').lower()
+
 # 処理設定
 PROCESS_EXISTING_FILES = os.getenv('PROCESS_EXISTING_FILES', 'false').lower() == 'true'
 SAVE_SEGMENTS = os.getenv('SAVE_SEGMENTS', 'true').lower() == 'true'
 
+# 並列処理設定
+# TRANSCRIBE_WORKERS: 同時に文字起こしを行うワーカー数（ワーカーごとにモデルを1つ読み込む）
+# TORCH_THREADS_PER_WORKER: ワーカー1つあたりのtorchスレッド数（0の場合はCPUコア数から自動算出）
+TRANSCRIBE_WORKERS = max(1, int(os.getenv('TRANSCRIBE_WORKERS', '1')))
+TORCH_THREADS_PER_WORKER = int(os.getenv('TORCH_THREADS_PER_WORKER', '0'))
+
+# 無音検出（VAD）設定
+# VAD_ENABLED: 無音のチャンクをスキップし、前後の無音を切り詰める
+# VAD_THRESHOLD_DB: 有音と判定するエネルギー閾値（dBFS）
+# VAD_MIN_SPEECH_MS: 有音区間の合計がこれ未満のチャンクは無音として扱う
+# VAD_PADDING_MS: 切り詰め時に発話の前後へ残す余白
+VAD_ENABLED = os.getenv('VAD_ENABLED', 'true').lower() == 'true'
+VAD_THRESHOLD_DB = float(os.getenv('VAD_THRESHOLD_DB', '-45'))
+VAD_MIN_SPEECH_MS = int(os.getenv('VAD_MIN_SPEECH_MS', '300'))
+VAD_PADDING_MS = int(os.getenv('VAD_PADDING_MS', '300'))
+
+# 音声読み込み設定
+# NATIVE_WAV_LOADER: 16bit PCM WAVをffmpegを使わずにPython内で読み込む（対応外の形式はffmpegで読み込む）
+NATIVE_WAV_LOADER = os.getenv('NATIVE_WAV_LOADER', 'true').lower() == 'true'
+
+# 先読み設定
+# PREFETCH_DEPTH: 推論中に読み込み・mel計算を済ませておくファイル数の上限（メモリ使用量の上限）
+PREFETCH_DEPTH = max(1, int(os.getenv('PREFETCH_DEPTH', '2')))
+
+# バッチ設定
+# BATCH_SIZE: キューに溜まったファイルの最初の30秒窓をまとめてデコードする最大数（1で無効）
+BATCH_SIZE = max(1, int(os.getenv('BATCH_SIZE', '1')))
+
+# 文字起こし結果のキャッシュ設定
+# TRANSCRIPT_CACHE_ENABLED: 同じ音声データ（コピー・リネームされたファイルなど）の結果を再利用する
+# TRANSCRIPT_CACHE_DIR: キャッシュの保存ディレクトリ
+# TRANSCRIPT_CACHE_MAX_MB: キャッシュ容量の上限（超えた場合は古く使われたものから削除）
+TRANSCRIPT_CACHE_ENABLED = os.getenv('TRANSCRIPT_CACHE_ENABLED', 'true').lower() == 'true'
+TRANSCRIPT_CACHE_DIR = resolve_path(os.getenv('TRANSCRIPT_CACHE_DIR', './.transcript_cache'))
+TRANSCRIPT_CACHE_MAX_MB = int(os.getenv('TRANSCRIPT_CACHE_MAX_MB', '200'))
+
+# 適応的モデル選択設定
+# ADAPTIVE_MODEL_ENABLED: キューが詰まっている間だけ高速なモデルに切り替える
+# FAST_MODEL_SIZE: 切り替え先のモデル（初めて必要になったときに読み込む）
+# ADAPTIVE_QUEUE_THRESHOLD: 待機中のファイル数がこの値以上になったら切り替える
+# ADAPTIVE_WAIT_THRESHOLD_SEC: 待ち時間がこの秒数以上になったら切り替える
+# ADAPTIVE_RECOVER_DEPTH: 待機中のファイル数がこの値以下に戻ったら元のモデルに戻す
+ADAPTIVE_MODEL_ENABLED = os.getenv('ADAPTIVE_MODEL_ENABLED', 'false').lower() == 'true'
+FAST_MODEL_SIZE = os.getenv('FAST_MODEL_SIZE', 'base')
+ADAPTIVE_QUEUE_THRESHOLD = int(os.getenv('ADAPTIVE_QUEUE_THRESHOLD', '5'))
+ADAPTIVE_WAIT_THRESHOLD_SEC = float(os.getenv('ADAPTIVE_WAIT_THRESHOLD_SEC', '120'))
+ADAPTIVE_RECOVER_DEPTH = int(os.getenv('ADAPTIVE_RECOVER_DEPTH', '0'))
+
+# 量子化設定（CPU専用）
+# WHISPER_QUANTIZE: int8 の場合、Linear層をint8に動的量子化したモデルを使う（none で無効）
+# QUANTIZED_MODEL_DIR: 量子化したモデルのキャッシュ先（2回目以降の起動で再利用）
+WHISPER_QUANTIZE = os.getenv('WHISPER_QUANTIZE', 'none').lower()
+QUANTIZED_MODEL_DIR = resolve_path(os.getenv('QUANTIZED_MODEL_DIR', './models'))
+
+# キューのスケジューリング設定
+# 録音直後のファイル（live）は既存ファイル（backfill）より常に先に処理する
+# QUEUE_MAX_SIZE: キューに保持するファイル数の上限（超えると既存ファイルの追加を待たせる）
+# LIVE_DEADLINE_SEC: 録音直後のファイルの処理期限（期限の早い順に処理）
+# BACKFILL_ORDER: 既存ファイルの処理順（newest: 新しい順, oldest: 古い順）
+# QUEUE_STATUS_PATH: キューの状態を書き出すファイル
+QUEUE_MAX_SIZE = max(1, int(os.getenv('QUEUE_MAX_SIZE', '1000')))
+LIVE_DEADLINE_SEC = float(os.getenv('LIVE_DEADLINE_SEC', '60'))
+BACKFILL_ORDER = os.getenv('BACKFILL_ORDER', 'newest').lower()
+QUEUE_STATUS_PATH = resolve_path(os.getenv('QUEUE_STATUS_PATH', './.queue_status.json'))
+
+# セッション（連続する録音チャンク）設定
+# SESSION_CONTEXT_ENABLED: 前のチャンクの文字起こし末尾をプロンプトに使い、音声の末尾を重ねてデコードする
+# SESSION_OVERLAP_SEC: 前のチャンクから重ねる音声の長さ
+# SESSION_PROMPT_CHARS: プロンプトに使う前のチャンクの文字数
+# SESSION_MAX_GAP_SEC: チャンク間の空き時間がこれを超えたら別のセッションとみなす
+# SESSION_WAIT_SEC: 前のチャンクの文字起こし完了を待つ最大時間
+SESSION_CONTEXT_ENABLED = os.getenv('SESSION_CONTEXT_ENABLED', 'false').lower() == 'true'
+SESSION_OVERLAP_SEC = float(os.getenv('SESSION_OVERLAP_SEC', '2.0'))
+SESSION_PROMPT_CHARS = int(os.getenv('SESSION_PROMPT_CHARS', '100'))
+SESSION_MAX_GAP_SEC = float(os.getenv('SESSION_MAX_GAP_SEC', '5'))
+SESSION_WAIT_SEC = float(os.getenv('SESSION_WAIT_SEC', '300'))
+
+# ストリーミング設定（長い録音をメモリ使用量一定で文字起こしする）
+# STREAMING_THRESHOLD_SEC: これより長いWAVは一括で読み込まず、区間ごとに読み込んで文字起こしする（0で無効）
+# STREAMING_WINDOW_SEC: 一度に読み込む区間の長さ
+STREAMING_THRESHOLD_SEC = float(os.getenv('STREAMING_THRESHOLD_SEC', '600'))
+STREAMING_WINDOW_SEC = max(30.0, float(os.getenv('STREAMING_WINDOW_SEC', '120')))
+STREAMING_PROMPT_CHARS = 200  # 次の区間にプロンプトとして渡す文字数
+
+# 分割並列処理設定（1つの長いファイルを無音の位置で区間に分け、複数のワーカーで同時に文字起こしする）
+# SPLIT_ENABLED: TRANSCRIBE_WORKERSが2以上の場合に有効
+# SPLIT_SPAN_SEC: 区間の目安の長さ（この長さの前後SPLIT_SEARCH_SECの範囲で最も静かな位置で分ける）
+SPLIT_ENABLED = os.getenv('SPLIT_ENABLED', 'false').lower() == 'true'
+SPLIT_SPAN_SEC = max(30.0, float(os.getenv('SPLIT_SPAN_SEC', '60')))
+SPLIT_SEARCH_SEC = float(os.getenv('SPLIT_SEARCH_SEC', '5'))
+
+# 書き込み中のWAVの追従設定（低遅延モード）
+# TAIL_FOLLOW_ENABLED: 録音中のファイルを追いかけて文字起こしし、暫定テキスト（.txt.provisional）を書き出す
+# TAIL_FOLLOW_MODEL_SIZE: 暫定テキストに使うモデル（確定テキストはWHISPER_MODEL_SIZEで文字起こしし直す）
+# TAIL_FOLLOW_MIN_SEC: 新しい音声がこの長さ以上たまったら文字起こしする
+# TAIL_FOLLOW_POLL_SEC: ファイルの伸びを確認する間隔
+TAIL_FOLLOW_ENABLED = os.getenv('TAIL_FOLLOW_ENABLED', 'false').lower() == 'true'
+TAIL_FOLLOW_MODEL_SIZE = os.getenv('TAIL_FOLLOW_MODEL_SIZE', FAST_MODEL_SIZE)
+TAIL_FOLLOW_MIN_SEC = float(os.getenv('TAIL_FOLLOW_MIN_SEC', '3'))
+TAIL_FOLLOW_POLL_SEC = float(os.getenv('TAIL_FOLLOW_POLL_SEC', '0.5'))
+
 # ログレベル
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 
@@ -69,165 +210,1117 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# 処理済みファイルの追跡
-PROCESSED_FILES_PATH = Path(__file__).parent / '.processed_files.json'
+if TRANSCRIBE_ENGINE not in ENGINE_NAMES:
+    logger.warning(f"不明なTRANSCRIBE_ENGINE（{TRANSCRIBE_ENGINE}）のためwhisperを使用します")
+    TRANSCRIBE_ENGINE = "whisper"
 
-class ProcessedFilesTracker:
-    """処理済みファイルを追跡するクラス"""
-    
-    def __init__(self, filepath):
-        self.filepath = filepath
-        self.processed_files = self._load()
-    
-    def _load(self):
-        """処理済みファイルリストを読み込む"""
-        if self.filepath.exists():
-            try:
-                with open(self.filepath, 'r') as f:
-                    return set(json.load(f))
-            except Exception as e:
-                logger.error(f"処理済みファイルリストの読み込みエラー: {e}")
-        return set()
-    
-    def _save(self):
-        """処理済みファイルリストを保存"""
+if DECODE_TIER not in DECODING_TIERS:
+    logger.warning(f"不明なDECODE_TIER（{DECODE_TIER}）のためaccurateを使用します")
+    DECODE_TIER = "accurate"
+
+def load_audio_file(audio_path):
+    """音声ファイルを16kHzモノラルのfloat32配列として読み込む"""
+    if NATIVE_WAV_LOADER:
         try:
-            with open(self.filepath, 'w') as f:
-                json.dump(list(self.processed_files), f, indent=2)
-        except Exception as e:
-            logger.error(f"処理済みファイルリストの保存エラー: {e}")
+            return load_wav(audio_path, SAMPLE_RATE)
+        except UnsupportedWavFormat as e:
+            logger.debug(f"ネイティブ読み込み非対応のためffmpegを使用 ({audio_path.name}): {e}")
+    return whisper.load_audio(str(audio_path))
+
+# 処理済みファイルの追跡
+PROCESSED_FILES_PATH = Path(__file__).parent / '.processed_files.db'
+LEGACY_PROCESSED_FILES_PATH = Path(__file__).parent / '.processed_files.json'
+
+@dataclass
+class QueueItem:
+    """処理キューに積まれる音声ファイル"""
+    path: Path
+    priority: int = PRIORITY_LIVE  # 優先度クラス
+    source: str = None  # 出力順序を保証する単位（録音ディレクトリと優先度クラス）
+    seq: int = None     # source内での処理開始順
+    cache_key: str = None  # 文字起こし結果のキャッシュキー
+    enqueued_at: float = 0.0  # キューに追加された時刻
+    # セッション（連続する録音チャンク）
+    previous: "QueueItem" = None  # 同じセッションの直前のチャンク
+    context_text: str = ""        # 次のチャンクに渡す文字起こし結果
+    context_ready: threading.Event = field(default_factory=threading.Event)
+
+
+@dataclass
+class PreparedAudio:
+    """読み込み・前処理（mel計算など）を済ませた音声"""
+    item: QueueItem
+    features: object  # エンジンの prepare の出力（whisperエンジンではmel）。Noneの場合はワーカーが読み込む
+    offset: float  # 音声の先頭のファイル上の位置（秒）。前のチャンクと重ねた場合は負になる
+    streaming: bool = False  # Trueの場合は前処理せず、ワーカーが区間ごとに読み込む
+    group: "SpanGroup" = None  # 分割した区間の場合、同じファイルの区間のまとまり
+    index: int = 0             # group内での区間の番号
+    duration: float = None     # 長いWAVを分割した区間の長さ（秒）。ワーカーが offset から読み込む
+
+
+class SpanGroup:
+    """1つのファイルを分割した区間の文字起こし結果を集める"""
     
-    def is_processed(self, filepath):
-        """ファイルが処理済みかチェック"""
-        return str(filepath) in self.processed_files
+    def __init__(self, starts):
+        """
+        Args:
+            starts: 各区間の先頭のファイル上の位置（秒）
+        """
+        self.starts = starts
+        self.count = len(starts)
+        self.results = {}
+        self.lock = threading.Lock()
     
-    def mark_as_processed(self, filepath):
-        """ファイルを処理済みとしてマーク"""
-        self.processed_files.add(str(filepath))
-        self._save()
+    def add(self, index, result):
+        """
+        区間の結果を追加
+        
+        Returns:
+            すべての区間がそろった場合は区間の順に並んだ結果のリスト、それ以外はNone
+        """
+        with self.lock:
+            self.results[index] = result
+            if len(self.results) < self.count:
+                return None
+            return [self.results[i] for i in range(self.count)]
 
 
 class AudioTranscriber:
     """Whisperを使用した音声文字起こしクラス"""
     
-    def __init__(self, model_size=WHISPER_MODEL_SIZE, device=None):
+    def __init__(self, model_size=WHISPER_MODEL_SIZE, device=None,
+                 num_workers=TRANSCRIBE_WORKERS, threads_per_worker=TORCH_THREADS_PER_WORKER,
+                 prefetch_depth=PREFETCH_DEPTH, batch_size=BATCH_SIZE,
+                 adaptive=ADAPTIVE_MODEL_ENABLED, fast_model_size=FAST_MODEL_SIZE):
         """
         初期化
         
         Args:
             model_size: Whisperモデルのサイズ（tiny, base, small, medium, large）
             device: 使用するデバイス（None, cuda, cpu）
+            num_workers: 並列に文字起こしを行うワーカー数
+            threads_per_worker: ワーカー1つあたりのtorchスレッド数（0で自動）
+            prefetch_depth: 先読みしておくファイル数の上限
+            batch_size: まとめてデコードするファイル数の上限
+            adaptive: キューが詰まっている間だけ高速なモデルに切り替える
+            fast_model_size: 切り替え先のモデルのサイズ
+        """
+        self.model_size = model_size
+        self.device = device
+        self.num_workers = max(1, num_workers)
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.batch_size = max(1, batch_size)
+        
+        # ワーカーごとにエンジン（モデル）を読み込む（whisperのモデルは同時に複数スレッドから使えないため）
+        self.models = [self._load_model(model_size) for _ in range(self.num_workers)]
+        self.model = self.models[0]
+        
+        # 適応的モデル選択（高速なモデルはワーカーごとに必要になった時点で読み込む）
+        self.adaptive = adaptive and fast_model_size != model_size
+        self.fast_model_size = fast_model_size
+        self.fast_models = [None] * self.num_workers
+        self.fast_mode = False
+        self.adaptive_lock = threading.Lock()
+        
+        # アイドル時のモデル解放（ワーカーごとの最終使用時刻と、事前読み込みを要求された時刻）
+        self.last_active = [time.time()] * self.num_workers
+        self.prewarm_requested_at = 0.0
+        
+        # 再デコード回数の分布（セグメント数）
+        self.retry_counts = Counter()
+        self.retry_lock = threading.Lock()
+        
+        # セッション（録音ディレクトリ -> (直前のチャンク, 更新日時, 末尾の音声)）
+        self.session_tails = {}
+        
+        # 処理済みファイルトラッカー
+        self.tracker = ProcessedFilesTracker(PROCESSED_FILES_PATH, LEGACY_PROCESSED_FILES_PATH)
+        
+        # 文字起こし結果のキャッシュ
+        self.cache = None
+        if TRANSCRIPT_CACHE_ENABLED:
+            self.cache = TranscriptCache(TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024)
+        
+        # 出力順序の管理（source単位で処理を始めた順に書き出す）
+        self.order_lock = threading.Lock()
+        self.next_seq = {}       # source -> 次に割り当てる番号
+        self.next_commit = {}    # source -> 次に書き出す番号
+        self.pending_results = {}  # source -> {seq: (item, result)}
+        
+        # 処理キュー
+        # queue: 投入されたファイル → 先読みスレッド → prepared: mel計算済み → 推論ワーカー
+        # バッチ処理時は1バッチ分を溜められるようにバッファを広げる
+        self.queue = TranscriptionScheduler(capacity=QUEUE_MAX_SIZE)
+        self.prepared = queue.Queue(maxsize=max(prefetch_depth, self.batch_size))
+        self.processing_threads = [
+            threading.Thread(target=self._process_queue, args=(worker_id,), daemon=True)
+            for worker_id in range(self.num_workers)
+        ]
+        for thread in self.processing_threads:
+            thread.start()
+        self.prefetch_thread = threading.Thread(target=self._prefetch_queue, daemon=True)
+        self.prefetch_thread.start()
+        
+        logger.info(f"文字起こしワーカー: {self.num_workers}個 (torchスレッド数: {self.threads_per_worker}/ワーカー)")
+    
+    def _load_model(self, model_size, required=True):
+        """
+        設定されたエンジンでWhisperモデルを読み込む
+        
+        Args:
+            model_size: Whisperモデルのサイズ
+            required: 読み込めない場合に終了する（起動時）。False の場合はNoneを返す（ワーカースレッドから呼ぶ場合）
         """
-        logger.info(f"Whisperモデル（{model_size}）を読み込み中...")
+        logger.info(f"Whisperモデル（{model_size}, エンジン: {TRANSCRIBE_ENGINE}）を読み込み中...")
+        
+        # 常駐推論デーモンが起動していればモデルの読み込みはデーモンに任せる
+        if INFERENCE_SOCKET:
+            engine = RemoteEngine(
+                resolve_path(INFERENCE_SOCKET), model_size, engine=TRANSCRIBE_ENGINE,
+                quantize=WHISPER_QUANTIZE, compute_type=FASTER_WHISPER_COMPUTE_TYPE
+            )
+            try:
+                engine.load()
+                logger.info(f"推論デーモンを使用します: {INFERENCE_SOCKET}")
+                return engine
+            except (OSError, RuntimeError) as e:
+                logger.warning(f"推論デーモンに接続できないため、モデルを読み込みます: {e}")
+        
+        # int8量子化モデル（量子化済みの重みはキャッシュから読み込む）
+        if TRANSCRIBE_ENGINE == "whisper" and WHISPER_QUANTIZE == "int8" and self.device not in (None, "cpu"):
+            logger.warning(f"int8量子化はCPU専用のため、{self.device}ではなくCPUで実行します")
         
         try:
-            # M4 Proチップ対応のためdeviceを指定しない（自動検出）
-            if device is None:
-                self.model = whisper.load_model(model_size)
-            else:
-                self.model = whisper.load_model(model_size, device=device)
-            
+            model = load_engine(
+                TRANSCRIBE_ENGINE, model_size, device=self.device,
+                quantize=WHISPER_QUANTIZE, quantized_model_dir=QUANTIZED_MODEL_DIR,
+                compute_type=FASTER_WHISPER_COMPUTE_TYPE, cpu_threads=self.threads_per_worker
+            )
             logger.info("Whisperモデルの読み込み完了")
+            return model
         except Exception as e:
             logger.error(f"Whisperモデルの読み込みに失敗しました: {e}")
-            logger.error("whisperがインストールされているか確認してください: pip install openai-whisper")
+            if TRANSCRIBE_ENGINE == "faster-whisper":
+                logger.error("faster-whisperがインストールされているか確認してください: pip install faster-whisper")
+            else:
+                logger.error("whisperがインストールされているか確認してください: pip install openai-whisper")
+            if not required:
+                return None
             sys.exit(1)
         
-        # 処理キュー
-        self.queue = queue.Queue()
-        self.processing_thread = threading.Thread(target=self._process_queue, daemon=True)
-        self.processing_thread.start()
-        
-        # 処理済みファイルトラッカー
-        self.tracker = ProcessedFilesTracker(PROCESSED_FILES_PATH)
-        
-    def _process_queue(self):
-        """キューから音声ファイルを取り出して処理"""
+    def _prefetch_queue(self):
+        """キューから音声ファイルを取り出し、読み込みとmel計算を先に済ませる"""
         while True:
             try:
-                audio_path = self.queue.get(timeout=1)
-                if audio_path is None:  # 終了シグナル
-                    break
-                
+                item = self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            
+            if item is None:  # 終了シグナル（全ワーカーに伝える）
+                for _ in self.processing_threads:
+                    self.prepared.put(None)
+                break
+            
+            # 出力順序の番号は取り出した順に振る（優先度で追い越しても後続を待たせない）
+            item.source = f"{item.path.parent}#{PRIORITY_NAMES[item.priority]}"
+            with self.order_lock:
+                item.seq = self.next_seq.get(item.source, 0)
+                self.next_seq[item.source] = item.seq + 1
+            
+            try:
                 # 既に処理済みかチェック
-                if self.tracker.is_processed(audio_path):
-                    logger.info(f"既に処理済み: {audio_path.name}")
-                    self.queue.task_done()
+                if self.tracker.is_processed(item.path):
+                    logger.info(f"既に処理済み: {item.path.name}")
+                    self._finish_without_model(item, None)
                     continue
                 
-                self._transcribe_file(audio_path)
-                self.queue.task_done()
+                # 同じ音声データの結果がキャッシュにあればモデルを通さずに確定
+                cached = self._lookup_cache(item)
+                if cached is not None:
+                    self._finish_without_model(item, cached)
+                    continue
+                
+                if self._should_stream(item):
+                    # 長い録音は読み込まずにワーカーへ渡す（セッションは区切る）
+                    # 分割できる場合は区間ごとに複数のワーカーで、できない場合は1つのワーカーが順に処理する
+                    if item.priority == PRIORITY_LIVE:
+                        self.session_tails.pop(item.path.parent, None)
+                    prepared = self._split_wav(item) if self._can_split(item) else None
+                    if prepared is None:
+                        prepared = PreparedAudio(item=item, features=None, offset=0.0, streaming=True)
+                else:
+                    prepared = self._prepare_audio(item)
+                if isinstance(prepared, PreparedAudio):
+                    # バッファが一杯の間は待機する（先読みによるメモリ使用量の上限）
+                    self.prepared.put(prepared)
+                elif isinstance(prepared, list):
+                    # 分割した区間は空いているワーカーがそれぞれ処理する
+                    for span in prepared:
+                        self.prepared.put(span)
+                else:
+                    # 無音・読み込み失敗はモデルを通さずに確定
+                    self._finish_without_model(item, prepared)
+            except Exception as e:
+                logger.error(f"先読み処理中のエラー: {e}")
+                self._finish_without_model(item, None)
+    
+    def _finish_without_model(self, item, result):
+        """モデルを通さずに結果を確定し、セッションを区切る"""
+        if item.priority == PRIORITY_LIVE:
+            self.session_tails.pop(item.path.parent, None)
+        item.context_text = result["text"].strip() if result else ""
+        item.context_ready.set()
+        self._commit(item, result)
+    
+    def _process_queue(self, worker_id):
+        """先読み済みの音声を取り出して文字起こし"""
+        # intra-opスレッド数はスレッドごとに設定する
+        torch.set_num_threads(self.threads_per_worker)
+        
+        while True:
+            try:
+                prepared = self.prepared.get(timeout=1.0)
             except queue.Empty:
+                self._manage_idle(worker_id)
                 continue
+            if prepared is None:  # 終了シグナル
+                break
+            self.last_active[worker_id] = time.time()
+            
+            # 待機中のファイルがあればバッチにまとめる
+            batch = [prepared]
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    extra = self.prepared.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is None:
+                    stopping = True
+                    break
+                batch.append(extra)
+            
+            model, model_size = self._select_model(worker_id, batch)
+            if not model.loaded and not self._reload_model(model, worker_id):
+                # 読み込めない場合は失敗として確定し、同じ録音元の後続ファイルを待たせない
+                for prepared in batch:
+                    self._finish_prepared(prepared, None)
+            else:
+                self._transcribe_batch(batch, model, model_size)
+            self.last_active[worker_id] = time.time()
+            if stopping:
+                break
+    
+    def _reload_model(self, model, worker_id):
+        """
+        解放したモデルを読み込み直す（失敗した場合は間隔を空けて再試行する）
+        
+        取り出したバッチはワーカーが持ったまま再試行する（先読みスレッドが埋めた prepared に戻すと、
+        空きを待つワーカーと先読みスレッドが互いを待ち続けるため）
+        
+        Returns:
+            読み込めた場合はTrue
+        """
+        delay = MODEL_RELOAD_RETRY_SEC
+        for attempt in range(MODEL_RELOAD_MAX_RETRIES + 1):
+            try:
+                model.load()
+                return True
+            except Exception as e:
+                if attempt == MODEL_RELOAD_MAX_RETRIES:
+                    logger.error(f"モデルを読み込めないため、取り出したファイルを失敗として確定します（ワーカー{worker_id}）: {e}")
+                    return False
+                logger.error(f"モデルの読み込みに失敗しました（{delay:.0f}秒後に再試行します, ワーカー{worker_id}）: {e}")
+                time.sleep(delay)
+                delay *= 2
+        return False
+    
+    def _manage_idle(self, worker_id):
+        """待機中のワーカーのモデルを解放・事前読み込みする（モデルを使うワーカー自身のスレッドで呼ぶ）"""
+        model = self.models[worker_id]
+        # 推論デーモンのモデルはデーモンが保持するため解放しない
+        if MODEL_IDLE_UNLOAD_SEC <= 0 or not model.supports_unload:
+            return
+        
+        if self.prewarm_requested_at > self.last_active[worker_id]:
+            # 録音が始まったので、ファイルが届く前に読み込んでおく
+            self.last_active[worker_id] = time.time()
+            if not model.loaded:
+                logger.info(f"録音を検出したためモデルを読み込みます（ワーカー{worker_id}）")
+                try:
+                    model.load()
+                except Exception as e:
+                    # ファイルが届いた時点で読み込み直す
+                    logger.error(f"モデルの事前読み込みに失敗しました（ワーカー{worker_id}）: {e}")
+        elif model.loaded and time.time() - self.last_active[worker_id] >= MODEL_IDLE_UNLOAD_SEC:
+            logger.info(f"{MODEL_IDLE_UNLOAD_SEC:.0f}秒間処理がないためモデルを解放します（ワーカー{worker_id}）")
+            model.unload()
+            fast_model = self.fast_models[worker_id]
+            if fast_model is not None and fast_model.supports_unload:
+                fast_model.unload()
+            self.last_active[worker_id] = time.time()
+    
+    def prewarm(self):
+        """解放したモデルの読み込みを各ワーカーに要求する（録音の開始を検出した時に呼ぶ）"""
+        self.prewarm_requested_at = time.time()
+    
+    def _select_model(self, worker_id, batch):
+        """キューの詰まり具合に応じて使用するモデルを選ぶ"""
+        if not self.adaptive:
+            return self.models[worker_id], self.model_size
+        
+        depth = self.queue.qsize() + self.prepared.qsize()
+        wait = time.time() - min(p.item.enqueued_at for p in batch)
+        
+        with self.adaptive_lock:
+            if not self.fast_mode and (depth >= ADAPTIVE_QUEUE_THRESHOLD or wait >= ADAPTIVE_WAIT_THRESHOLD_SEC):
+                self.fast_mode = True
+                logger.info(f"キューが詰まっているため高速モデル（{self.fast_model_size}）に切り替えます "
+                            f"(待機数: {depth}, 待ち時間: {wait:.1f}秒)")
+            elif self.fast_mode and depth <= ADAPTIVE_RECOVER_DEPTH and wait < ADAPTIVE_WAIT_THRESHOLD_SEC:
+                self.fast_mode = False
+                logger.info(f"キューが解消したためモデル（{self.model_size}）に戻します")
+            fast_mode = self.fast_mode
+        
+        if not fast_mode:
+            return self.models[worker_id], self.model_size
+        
+        if self.fast_models[worker_id] is None:
+            # ワーカースレッドで終了するとバッチが確定されず、同じ録音元の後続の結果も出力されなくなるため、
+            # 読み込めない場合は元のモデルで処理を続ける
+            fast_model = self._load_model(self.fast_model_size, required=False)
+            if fast_model is None:
+                logger.error(f"高速モデル（{self.fast_model_size}）を読み込めないため適応的モデル選択を無効にします")
+                self.adaptive = False
+                return self.models[worker_id], self.model_size
+            if fast_model.input_format != self.model.input_format:
+                # 先読みしたmelをそのまま使えないモデルには切り替えない
+                logger.error(f"{self.fast_model_size}は入力の形式（メル周波数ビン数）が異なるため適応的モデル選択を無効にします")
+                self.adaptive = False
+                return self.models[worker_id], self.model_size
+            self.fast_models[worker_id] = fast_model
+        return self.fast_models[worker_id], self.fast_model_size
+    
+    def _transcribe_batch(self, batch, model, model_size):
+        """先読み済みの音声をまとめて文字起こし"""
+        # 前のチャンクの文字起こしを待つファイルはプロンプトが決まらないためバッチに含めない
+        first_results = {}
+        independent = [p for p in batch if p.item.previous is None and p.features is not None]
+        if len(independent) > 1 and model.supports_batch:
+            try:
+                # 最初の窓はエンコーダー・デコーダーともにバッチで処理
+                results = model.decode_first_windows([p.features for p in independent], WHISPER_LANGUAGE)
+                first_results = {id(p): r for p, r in zip(independent, results)}
+                logger.info(f"バッチデコード: {len(independent)}ファイル")
+            except Exception as e:
+                logger.error(f"バッチデコードエラー（1ファイルずつ処理します）: {e}")
+        
+        for prepared in batch:
+            result = None
+            try:
+                if prepared.streaming:
+                    result = self._transcribe_stream(prepared, model)
+                else:
+                    result = self._transcribe_file(prepared, model, first_result=first_results.get(id(prepared)))
+                if result is not None:
+                    result["model"] = model_size
             except Exception as e:
                 logger.error(f"キュー処理中のエラー: {e}")
+            self._finish_prepared(prepared, result)
+    
+    def _finish_prepared(self, prepared, result):
+        """先読み済みの音声の文字起こし結果を確定する（失敗時はNone）"""
+        if prepared.group is not None:
+            # 分割した区間はすべてそろってから1つの結果にまとめる
+            results = prepared.group.add(prepared.index, result)
+            if results is None:
+                return
+            result = self._merge_spans(results, prepared.group.starts)
+        
+        # 次のチャンクに文字起こし結果を渡す（失敗時は空）
+        prepared.item.context_text = result["text"].strip() if result else ""
+        prepared.item.context_ready.set()
+        # 失敗時も順番を進めて後続ファイルを待たせない
+        self._commit(prepared.item, result)
+    
+    def _merge_spans(self, results, starts):
+        """分割した区間の結果をまとめる（1つでも失敗していればNone）"""
+        if any(result is None for result in results):
+            return None
+        result = merge_span_results(results, starts)
+        result["status"] = "transcribed"
+        # 高速モデルで処理した区間があればそのモデルを記録する（キャッシュには保存しない）
+        models = {span["model"] for span in results}
+        result["model"] = next((model for model in models if model != self.model_size), self.model_size)
+        return result
+    
+    def add_to_queue(self, audio_path, priority=PRIORITY_LIVE, block=True, timeout=None):
+        """
+        音声ファイルを処理キューに追加
+        
+        Args:
+            audio_path: 音声ファイルのパス
+            priority: PRIORITY_LIVE（録音直後）または PRIORITY_BACKFILL（既存ファイル）
+            block: キューが上限に達している場合に空きが出るまで待つ（既存ファイルのみ）
+            timeout: 待つ最大時間（秒）
+        
+        Raises:
+            queue.Full: キューが上限に達していて追加できなかった場合
+        """
+        now = time.time()
+        item = QueueItem(path=audio_path, priority=priority, enqueued_at=now)
+        
+        if priority == PRIORITY_LIVE:
+            # 期限の早い順（= 録音された順）
+            deadline = now + LIVE_DEADLINE_SEC
+            sort_key = deadline
+        else:
+            deadline = None
+            try:
+                mtime = audio_path.stat().st_mtime
+            except OSError:
+                mtime = now
+            sort_key = -mtime if BACKFILL_ORDER == "newest" else mtime
+        
+        self.queue.put(item, priority, sort_key, deadline=deadline, name=audio_path.name,
+                       block=block, timeout=timeout)
+        logger.info(f"キューに追加: {audio_path.name} ({PRIORITY_NAMES[priority]})")
+    
+    def queue_status(self):
+        """キューの状態を取得"""
+        status = self.queue.snapshot()
+        status["prepared"] = self.prepared.qsize()
+        status["workers"] = self.num_workers
+        status["fast_mode"] = self.fast_mode
+        status["decode_tier"] = DECODE_TIER
+        with self.retry_lock:
+            status["segment_retries"] = {str(retries): count for retries, count in sorted(self.retry_counts.items())}
+        return status
+    
+    def _record_retries(self, audio_path, segments):
+        """セグメントごとの再デコード回数を集計してログに出す"""
+        retries = [segment.get("retries", 0) for segment in segments]
+        with self.retry_lock:
+            self.retry_counts.update(retries)
+        retried = sum(1 for count in retries if count > 0)
+        if retried:
+            logger.info(f"再デコード: {audio_path.name} {retried}/{len(retries)}セグメント (最大{max(retries)}回)")
+    
+    def _commit(self, item, result):
+        """文字起こし結果をsource内の投入順に書き出す"""
+        with self.order_lock:
+            pending = self.pending_results.setdefault(item.source, {})
+            pending[item.seq] = (item, result)
+            
+            next_seq = self.next_commit.get(item.source, 0)
+            while next_seq in pending:
+                ready_item, ready_result = pending.pop(next_seq)
+                if ready_result is not None:
+                    self._save_transcript(ready_item, ready_result)
+                # 録音中に書き出した暫定テキストは、確定テキストの有無（無音・処理済み・失敗）にかかわらず削除
+                (TEXT_OUTPUT_DIR / (ready_item.path.stem + ".txt.provisional")).unlink(missing_ok=True)
+                next_seq += 1
+            self.next_commit[item.source] = next_seq
+    
+    def _lookup_cache(self, item):
+        """キャッシュから文字起こし結果を取得（ない場合はNone）"""
+        if self.cache is None:
+            return None
+        
+        try:
+            item.cache_key = TranscriptCache.make_key(
+                pcm_hash(item.path), self.model_size, WHISPER_LANGUAGE, WHISPER_QUANTIZE, TRANSCRIBE_ENGINE,
+                DECODE_TIER
+            )
+        except OSError as e:
+            logger.warning(f"ハッシュ計算エラー ({item.path.name}): {e}")
+            return None
+        
+        result = self.cache.get(item.cache_key)
+        if result is None:
+            return None
+        
+        logger.info(f"キャッシュから文字起こし結果を再利用: {item.path.name} "
+                    f"(ヒット率: {self.cache.hits}/{self.cache.hits + self.cache.misses})")
+        result["status"] = "cached"
+        result["model"] = self.model_size
+        return result
+    
+    def _prepare_audio(self, item):
+        """
+        音声の読み込み・無音検出・mel計算を行う
+        
+        Returns:
+            PreparedAudio（分割した場合はそのリスト）。無音の場合は結果の辞書、読み込みに失敗した場合はNone
+        """
+        audio_path = item.path
+        try:
+            audio = load_audio_file(audio_path)
+            
+            # 録音直後のチャンクは、同じセッションの前のチャンクの末尾を先頭に重ねる
+            overlap = 0
+            if SESSION_CONTEXT_ENABLED and item.priority == PRIORITY_LIVE:
+                audio, overlap = self._attach_session(item, audio)
+            start, end = 0, len(audio)
+            
+            # 無音検出：無音チャンクはモデルに渡さず、前後の無音は切り詰める
+            # （判定はこのチャンク自身の音声で行い、重ねた部分は切り詰めない）
+            if VAD_ENABLED:
+                region = find_speech_region(
+                    audio[overlap:], SAMPLE_RATE,
+                    threshold_db=VAD_THRESHOLD_DB,
+                    min_speech_ms=VAD_MIN_SPEECH_MS,
+                    padding_ms=VAD_PADDING_MS
+                )
+                if region is None:
+                    logger.info(f"無音のためスキップ: {audio_path.name}")
+                    item.previous = None
+                    return {"status": "silent", "text": "", "segments": []}
+                
+                start = 0 if overlap else region[0]
+                end = overlap + region[1]
+            
+            offset = (start - overlap) / SAMPLE_RATE
+            if self._can_split(item):
+                spans = self._split_audio(item, audio[start:end], offset)
+                if spans is not None:
+                    return spans
+            
+            features = self.model.prepare(audio[start:end])
+            return PreparedAudio(item=item, features=features, offset=offset)
+            
+        except Exception as e:
+            logger.error(f"音声読み込みエラー ({audio_path.name}): {e}")
+            return None
+    
+    def _split_audio(self, item, audio, offset):
+        """
+        音声を無音の位置で区間に分割する
+        
+        Returns:
+            区間ごとのPreparedAudioのリスト。分割しない場合はNone
+        """
+        points = find_split_points(audio, SAMPLE_RATE, SPLIT_SPAN_SEC, search_sec=SPLIT_SEARCH_SEC)
+        if not points:
+            return None
+        
+        bounds = [0] + points + [len(audio)]
+        group = SpanGroup([offset + span_start / SAMPLE_RATE for span_start in bounds[:-1]])
+        logger.info(f"{len(bounds) - 1}個の区間に分割して並列に文字起こしします: {item.path.name}")
+        return [
+            PreparedAudio(
+                item=item,
+                features=self.model.prepare(audio[span_start:span_end]),
+                offset=offset + span_start / SAMPLE_RATE,
+                group=group,
+                index=index
+            )
+            for index, (span_start, span_end) in enumerate(zip(bounds, bounds[1:]))
+        ]
+    
+    def _split_wav(self, item):
+        """
+        長いWAVを一括で読み込まずに無音の位置で区間に分割する（各区間はワーカーが読み込む）
+        
+        Returns:
+            区間ごとのPreparedAudioのリスト。分割しない場合はNone
+        """
+        duration = wav_duration(item.path)
+        points = find_wav_split_points(item.path, SPLIT_SPAN_SEC, search_sec=SPLIT_SEARCH_SEC,
+                                       window_sec=STREAMING_WINDOW_SEC, target_rate=SAMPLE_RATE)
+        if not points:
+            return None
+        
+        bounds = [0.0] + points + [duration]
+        group = SpanGroup(bounds[:-1])
+        logger.info(f"{len(bounds) - 1}個の区間に分割して並列に文字起こしします: {item.path.name} (長さ: {duration:.0f}秒)")
+        return [
+            PreparedAudio(item=item, features=None, offset=span_start, group=group, index=index,
+                          duration=span_end - span_start)
+            for index, (span_start, span_end) in enumerate(zip(bounds, bounds[1:]))
+        ]
+    
+    def _read_span(self, prepared, model):
+        """
+        長いWAVを分割した区間を読み込む
+        
+        Returns:
+            エンジンの prepare の出力。無音の区間の場合はNone
+        """
+        audio = read_wav_window(prepared.item.path, prepared.offset, prepared.duration, SAMPLE_RATE)
+        if VAD_ENABLED and find_speech_region(
+            audio, SAMPLE_RATE,
+            threshold_db=VAD_THRESHOLD_DB,
+            min_speech_ms=VAD_MIN_SPEECH_MS,
+            padding_ms=VAD_PADDING_MS
+        ) is None:
+            return None
+        return model.prepare(audio)
+    
+    def _can_split(self, item):
+        """1つのファイルを区間に分けて複数のワーカーで文字起こしするか判定"""
+        return SPLIT_ENABLED and self.num_workers > 1 and item.previous is None
+    
+    def _should_stream(self, item):
+        """区間ごとに読み込んで文字起こしする長さのWAVか判定"""
+        if STREAMING_THRESHOLD_SEC <= 0:
+            return False
+        try:
+            return wav_duration(item.path) > STREAMING_THRESHOLD_SEC
+        except (OSError, UnsupportedWavFormat):
+            return False  # ffmpegで読み込む形式は一括で処理する
     
-    def add_to_queue(self, audio_path):
-        """音声ファイルを処理キューに追加"""
-        self.queue.put(audio_path)
-        logger.info(f"キューに追加: {audio_path.name}")
+    def _attach_session(self, item, audio):
+        """
+        同じセッションの前のチャンクの末尾の音声を先頭に重ねる
+        
+        Returns:
+            (重ねた音声, 重ねたサンプル数)
+        """
+        directory = item.path.parent
+        last = self.session_tails.pop(directory, None)
+        try:
+            mtime = item.path.stat().st_mtime
+        except OSError:
+            return audio, 0
+        
+        overlap = np.zeros(0, dtype=np.float32)
+        if last is not None:
+            previous_item, previous_mtime, tail = last
+            # 録音間隔（このチャンクの長さ）+ 許容する空き時間以内なら同じセッション
+            if mtime - previous_mtime <= len(audio) / SAMPLE_RATE + SESSION_MAX_GAP_SEC:
+                item.previous = previous_item
+                overlap = tail
+        
+        tail_samples = int(SESSION_OVERLAP_SEC * SAMPLE_RATE)
+        tail = audio[max(len(audio) - tail_samples, 0):].copy()
+        self.session_tails[directory] = (item, mtime, tail)
+        
+        if len(overlap) == 0:
+            return audio, 0
+        return np.concatenate([overlap, audio]), len(overlap)
     
-    def _transcribe_file(self, audio_path):
-        """単一の音声ファイルを文字起こし"""
+    def _transcribe_file(self, prepared, model, first_result=None):
+        """単一の音声ファイルを文字起こし（結果の保存は_commitで行う）"""
+        item = prepared.item
+        audio_path = item.path
         try:
+            # 同じセッションの前のチャンクの文字起こしを待ち、末尾をプロンプトに使う
+            previous_text = ""
+            if item.previous is not None:
+                if item.previous.context_ready.wait(timeout=SESSION_WAIT_SEC):
+                    previous_text = item.previous.context_text
+                else:
+                    logger.warning(f"前のチャンクの文字起こしを待機中にタイムアウト: {audio_path.name}")
+            prompt = previous_text[-SESSION_PROMPT_CHARS:] if SESSION_PROMPT_CHARS > 0 else ""
+            
+            features = prepared.features
+            if features is None:
+                # 長いWAVを分割した区間はここで読み込む（無音の区間は文字起こししない）
+                features = self._read_span(prepared, model)
+                if features is None:
+                    return {"status": "transcribed", "text": "", "segments": []}
+            
             logger.info(f"文字起こし開始: {audio_path.name}")
             start_time = time.time()
             
-            # Whisperで文字起こし
-            result = self.model.transcribe(
-                str(audio_path),
-                language=WHISPER_LANGUAGE,
-                verbose=False,
-                fp16=False  # M4 Proでの互換性のため
-            )
+            # Whisperで文字起こし（前処理は先読みスレッドで計算済み）
+            result = model.transcribe(features, WHISPER_LANGUAGE, attempts=DECODING_TIERS[DECODE_TIER],
+                                      initial_prompt=prompt or None, first_result=first_result)
+            result["status"] = "transcribed"
+            self._record_retries(audio_path, result["segments"])
+            
+            # 切り詰めた分だけタイムスタンプを元の音声の位置に戻す
+            if prepared.offset:
+                for segment in result["segments"]:
+                    segment["start"] += prepared.offset
+                    segment["end"] += prepared.offset
+            
+            # 前のチャンクと重ねた部分の重複を取り除く
+            if prepared.offset < 0:
+                result["segments"] = drop_overlap_segments(result["segments"])
+                text = "".join(segment["text"] for segment in result["segments"])
+                result["text"] = dedupe_prefix(previous_text, text)
+            
+            elapsed_time = time.time() - start_time
+            logger.info(f"文字起こし完了: {audio_path.name} (処理時間: {elapsed_time:.2f}秒)")
+            return result
+            
+        except Exception as e:
+            logger.error(f"文字起こしエラー ({audio_path.name}): {e}")
+            return None
+    
+    def _transcribe_stream(self, prepared, model):
+        """
+        長いWAVを区間ごとに読み込んで文字起こし（メモリ使用量は区間の長さで決まる）
+        
+        確定したテキストは区間ごとに途中経過ファイル（.txt.partial）へ追記し、
+        保存時に.txtへ置き換えます。
+        """
+        audio_path = prepared.item.path
+        partial_path = TEXT_OUTPUT_DIR / (audio_path.stem + ".txt.partial")
+        try:
+            duration = wav_duration(audio_path)
+            logger.info(f"ストリーミング文字起こし開始: {audio_path.name} (長さ: {duration:.0f}秒)")
+            start_time = time.time()
+            
+            segments = []
+            texts = []
+            prompt = ""
+            position = 0.0
+            with open(partial_path, "w", encoding="utf-8") as f:
+                while position < duration:
+                    audio = read_wav_window(audio_path, position, STREAMING_WINDOW_SEC, SAMPLE_RATE)
+                    if len(audio) == 0:
+                        break
+                    window_end = position + len(audio) / SAMPLE_RATE
+                    
+                    if VAD_ENABLED and find_speech_region(
+                        audio, SAMPLE_RATE,
+                        threshold_db=VAD_THRESHOLD_DB,
+                        min_speech_ms=VAD_MIN_SPEECH_MS,
+                        padding_ms=VAD_PADDING_MS
+                    ) is None:
+                        position = window_end
+                        prompt = ""
+                        continue
+                    
+                    result = model.transcribe(model.prepare(audio), WHISPER_LANGUAGE,
+                                              attempts=DECODING_TIERS[DECODE_TIER], initial_prompt=prompt or None)
+                    window_segments = result["segments"]
+                    
+                    # 区間の末尾で切れている可能性のある最後のセグメントは、次の区間で読み直す
+                    if window_end < duration and len(window_segments) > 1 and window_segments[-1]["start"] > 0:
+                        window_end = position + window_segments[-1]["start"]
+                        window_segments = window_segments[:-1]
+                    
+                    window_text = "".join(segment["text"] for segment in window_segments)
+                    for segment in window_segments:
+                        segment["start"] += position
+                        segment["end"] += position
+                    segments.extend(window_segments)
+                    texts.append(window_text)
+                    
+                    f.write(window_text if f.tell() else window_text.lstrip())
+                    f.flush()
+                    prompt = ("".join(texts[-2:]))[-STREAMING_PROMPT_CHARS:].strip()
+                    position = window_end
+                    logger.debug(f"ストリーミング文字起こし: {audio_path.name} {position:.0f}/{duration:.0f}秒")
+            
+            self._record_retries(audio_path, segments)
+            elapsed_time = time.time() - start_time
+            logger.info(f"文字起こし完了: {audio_path.name} (処理時間: {elapsed_time:.2f}秒)")
+            return {
+                "status": "transcribed",
+                "text": "".join(texts),
+                "segments": segments,
+                "partial_path": partial_path,
+            }
+            
+        except Exception as e:
+            logger.error(f"文字起こしエラー ({audio_path.name}): {e}")
+            partial_path.unlink(missing_ok=True)
+            return None
+    
+    def _save_transcript(self, item, result):
+        """文字起こし結果を保存し、処理済みとしてマーク"""
+        audio_path = item.path
+        try:
+            # 無音のチャンクはテキストを書き出さず、判定結果だけ記録する
+            if result["status"] == "silent":
+                self.tracker.mark_as_processed(audio_path, status="silent")
+                return
             
             # テキストファイル名を生成
             text_filename = audio_path.stem + ".txt"
             text_path = TEXT_OUTPUT_DIR / text_filename
             
-            # テキストファイルに保存
-            with open(text_path, "w", encoding="utf-8") as f:
-                # メタデータを含める
-                # f.write(f"# 音声ファイル: {audio_path.name}\n")
-                # f.write(f"# 文字起こし日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                # f.write(f"# Whisperモデル: {WHISPER_MODEL_SIZE}\n")
-                # f.write("\n" + "="*50 + "\n\n")
-                f.write(result["text"].strip())
+            partial_path = result.pop("partial_path", None)
+            if partial_path is not None:
+                # ストリーミングで書き出した途中経過ファイルを置き換えて確定する
+                os.replace(partial_path, text_path)
+            else:
+                # テキストファイルに保存
+                with open(text_path, "w", encoding="utf-8") as f:
+                    # メタデータを含める
+                    # f.write(f"# 音声ファイル: {audio_path.name}\n")
+                    # f.write(f"# 文字起こし日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                    # f.write(f"# Whisperモデル: {WHISPER_MODEL_SIZE}\n")
+                    # f.write("\n" + "="*50 + "\n\n")
+                    f.write(result["text"].strip())
             
-            elapsed_time = time.time() - start_time
-            logger.info(f"文字起こし完了: {text_filename} (処理時間: {elapsed_time:.2f}秒)")
+            logger.info(f"テキストを保存: {text_filename}")
             
-            # # セグメント情報も保存（オプション）
-            # if SAVE_SEGMENTS:
-            #     segments_filename = audio_path.stem + "_segments.txt"
-            #     segments_path = TEXT_OUTPUT_DIR / segments_filename
-                
-            #     with open(segments_path, "w", encoding="utf-8") as f:
-            #         f.write(f"# 音声ファイル: {audio_path.name}\n")
-            #         f.write(f"# セグメント情報\n")
-            #         f.write("\n" + "="*50 + "\n\n")
-                    
-            #         for segment in result["segments"]:
-            #             f.write(f"[{segment['start']:.2f}s - {segment['end']:.2f}s] {segment['text']}\n")
+            # セグメント情報も保存（オプション）
+            if SAVE_SEGMENTS and result["segments"]:
+                write_segments(segments_path(text_path), result["segments"])
+            
+            # 新しく文字起こしした結果はキャッシュに保存
+            # （高速モデルの結果と、前のチャンクに依存するセッション中の結果は除く）
+            if (self.cache is not None and item.cache_key and result["status"] == "transcribed"
+                    and result["model"] == self.model_size and item.previous is None):
+                self.cache.put(item.cache_key, {"text": result["text"], "segments": result["segments"]})
             
             # 処理済みとしてマーク
-            self.tracker.mark_as_processed(audio_path)
+            self.tracker.mark_as_processed(audio_path, status=result["status"], model=result["model"])
             
         except Exception as e:
-            logger.error(f"文字起こしエラー ({audio_path.name}): {e}")
+            logger.error(f"テキスト保存エラー ({audio_path.name}): {e}")
+    
+    def stop(self):
+        """
+        処理を停止
+        
+        録音直後のファイルは PROCESS_EXISTING_FILES の設定によっては次回起動時に処理されないため、
+        キューに残っている分を処理し終えてから停止する（既存ファイルは次回起動時に再び追加される）
+        """
+        remaining = self.queue.snapshot()["by_priority"].get(PRIORITY_NAMES[PRIORITY_LIVE], {}).get("count", 0)
+        if remaining:
+            logger.info(f"キューに残っている録音直後のファイルを処理してから終了します: {remaining}個")
+        self.queue.close(drain=True)
+        self.prefetch_thread.join()
+        for thread in self.processing_threads:
+            thread.join()
+        self.tracker.close()
+
+
+class FileReadinessScheduler:
+    """ファイルの書き込み完了をwatchdogの監視スレッドとは別のスレッドで確認するクラス"""
+    
+    def __init__(self, on_ready, poll_interval=0.1, stable_checks=5, timeout=30):
+        """
+        Args:
+            on_ready: 書き込みが完了したファイルを受け取る関数
+            poll_interval: サイズを確認する間隔（秒）
+            stable_checks: この回数続けてサイズが変わらなければ完了とみなす
+            timeout: 完了を待つ最大時間（秒）
+        """
+        self.on_ready = on_ready
+        self.poll_interval = poll_interval
+        self.stable_checks = stable_checks
+        self.timeout = timeout
+        
+        self.condition = threading.Condition()
+        self.pending = {}  # パス -> [前回のサイズ, サイズが変わらなかった回数, 期限]
+        self.done = set()  # 完了を通知したファイル（重複処理を防ぐ）
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def watch(self, file_path):
+        """ファイルを監視対象に追加（書き込みが完了していればすぐに通知）"""
+        if wav_is_complete(file_path):
+            self._notify(file_path)
+            return
+        
+        with self.condition:
+            if file_path in self.done or file_path in self.pending:
+                return
+            self.pending[file_path] = [-1, 0, time.time() + self.timeout]
+            self.condition.notify()
+    
+    def mark_closed(self, file_path):
+        """書き込み後にファイルが閉じられた（IN_CLOSE_WRITE）"""
+        # 録音ファイルが分割して書き込まれる場合に備えてヘッダーの長さも確認する
+        if wav_is_complete(file_path):
+            self._notify(file_path)
+        else:
+            self.watch(file_path)
+    
+    def _notify(self, file_path):
+        """完了したファイルを一度だけ通知"""
+        with self.condition:
+            self.pending.pop(file_path, None)
+            if file_path in self.done:
+                return
+            self.done.add(file_path)
+        self.on_ready(file_path)
+    
+    def _run(self):
+        """書き込み中のファイルのサイズを定期的に確認"""
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                paths = list(self.pending)
+            
+            now = time.time()
+            for file_path in paths:
+                with self.condition:
+                    state = self.pending.get(file_path)
+                if state is None:
+                    continue
+                
+                if wav_is_complete(file_path):
+                    self._notify(file_path)
+                    continue
+                
+                try:
+                    current_size = file_path.stat().st_size
+                except OSError:
+                    current_size = -1
+                
+                if current_size == state[0] and current_size > 0:
+                    state[1] += 1
+                    if state[1] >= self.stable_checks:  # 一定時間サイズが変わらない
+                        self._notify(file_path)
+                        continue
+                else:
+                    state[0] = current_size
+                    state[1] = 0
+                
+                if now >= state[2]:
+                    logger.warning(f"ファイルの準備完了を待機中にタイムアウト: {file_path.name}")
+                    self._notify(file_path)
+            
+            time.sleep(self.poll_interval)
     
     def stop(self):
-        """処理を停止"""
-        self.queue.put(None)
-        self.processing_thread.join()
+        """監視を停止"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+
+class TailFollower:
+    """書き込み中のWAVを追いかけて文字起こしし、暫定テキストを書き出すクラス"""
+    
+    def __init__(self, model, poll_interval=TAIL_FOLLOW_POLL_SEC, min_sec=TAIL_FOLLOW_MIN_SEC):
+        """
+        Args:
+            model: 暫定テキスト用のエンジン（このクラスのスレッドだけが使う）
+            poll_interval: ファイルの伸びを確認する間隔（秒）
+            min_sec: 新しい音声がこの長さ以上たまったら文字起こしする
+        """
+        self.model = model
+        self.poll_interval = poll_interval
+        self.min_sec = min_sec
+        
+        self.condition = threading.Condition()
+        self.following = {}  # パス -> [確定した位置（秒）, 確定したテキスト, 前回文字起こしした時点のサンプル数]
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def follow(self, file_path):
+        """書き込み中のファイルを追従対象に追加"""
+        with self.condition:
+            self.following.setdefault(file_path, [0.0, "", 0])
+            self.condition.notify()
+    
+    def finish(self, file_path):
+        """ファイルの書き込みが完了したので追従をやめる（以降は通常の文字起こしで確定する）"""
+        with self.condition:
+            self.following.pop(file_path, None)
+    
+    def _run(self):
+        """追従中のファイルを順に確認"""
+        while True:
+            with self.condition:
+                while self.running and not self.following:
+                    # 追従するファイルがない間はモデルを解放する
+                    if (not self.condition.wait(timeout=MODEL_IDLE_UNLOAD_SEC or None)
+                            and self.model.supports_unload and self.model.loaded):
+                        logger.info("暫定テキスト用のモデルを解放します")
+                        self.model.unload()
+                if not self.running:
+                    break
+                paths = list(self.following)
+            
+            for file_path in paths:
+                try:
+                    self._update(file_path)
+                except Exception as e:
+                    logger.debug(f"暫定文字起こしエラー ({file_path.name}): {e}")
+            
+            time.sleep(self.poll_interval)
+    
+    def _update(self, file_path):
+        """新しくたまった音声を文字起こしし、暫定テキストを書き出す"""
+        with self.condition:
+            state = self.following.get(file_path)
+        if state is None:
+            return
+        position, committed_text, decoded_samples = state
+        
+        # 前回の文字起こし以降に min_sec 以上の音声が増えた場合だけ文字起こしする
+        # （何も確定しなかった場合に、同じ窓をポーリングのたびに文字起こしし直さない）
+        duration = wav_duration(file_path)
+        total_samples = int(duration * SAMPLE_RATE)
+        available = duration - position
+        if available < self.min_sec or total_samples - decoded_samples < self.min_sec * SAMPLE_RATE:
+            return
+        
+        # 1回に文字起こしするのは最大30秒（Whisperの窓の長さ）
+        window_sec = min(available, N_SAMPLES / SAMPLE_RATE)
+        audio = read_wav_window(file_path, position, window_sec, SAMPLE_RATE)
+        
+        # 無音の窓は文字起こししない（無音からの誤認識を防ぎ、録音の待機中にCPUを使わない）
+        # 発話の始まりを切らないよう、末尾の余白分は次の窓に残して先へ進む
+        if VAD_ENABLED and find_speech_region(
+                audio, SAMPLE_RATE, threshold_db=VAD_THRESHOLD_DB,
+                min_speech_ms=VAD_MIN_SPEECH_MS, padding_ms=VAD_PADDING_MS) is None:
+            advance = max(0.0, window_sec - VAD_PADDING_MS / 1000)
+            with self.condition:
+                if file_path in self.following:
+                    self.following[file_path] = [position + advance, committed_text, total_samples]
+            return
+        
+        # 暫定テキストは遅延を優先し、再デコードは最小限にする
+        result = self.model.transcribe(self.model.prepare(audio), WHISPER_LANGUAGE,
+                                       attempts=DECODING_TIERS["fast"],
+                                       initial_prompt=committed_text[-STREAMING_PROMPT_CHARS:].strip() or None)
+        segments = result["segments"]
+        
+        # 最後のセグメントはまだ話している途中の可能性があるので暫定のままにし、それより前を確定する
+        # （窓が一杯で最後のセグメントしかない場合は確定して先へ進む）
+        if len(segments) > 1 and segments[-1]["start"] > 0:
+            settled, pending = segments[:-1], segments[-1:]
+            advance = segments[-1]["start"]
+        elif window_sec >= N_SAMPLES / SAMPLE_RATE:
+            settled, pending = segments, []
+            advance = window_sec
+        else:
+            settled, pending, advance = [], segments, 0.0
+        
+        committed_text += "".join(segment["text"] for segment in settled)
+        provisional_text = committed_text + "".join(segment["text"] for segment in pending)
+        
+        text_path = TEXT_OUTPUT_DIR / (file_path.stem + ".txt.provisional")
+        tmp_path = text_path.with_suffix(".tmp")
+        with self.condition:
+            if file_path not in self.following:
+                return  # 文字起こし中に書き込みが完了した（確定テキストの保存後に書き出さない）
+            self.following[file_path] = [position + advance, committed_text, total_samples]
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(provisional_text.strip())
+            os.replace(tmp_path, text_path)
+        logger.debug(f"暫定テキストを更新: {text_path.name} ({position + window_sec:.1f}秒まで)")
+    
+    def stop(self):
+        """追従を停止"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
 
 
 class AudioFileHandler(FileSystemEventHandler):
     """音声ファイルの作成を監視するハンドラー"""
     
-    def __init__(self, transcriber):
+    def __init__(self, transcriber, tail_follower=None):
+        """
+        Args:
+            transcriber: AudioTranscriber
+            tail_follower: 書き込み中のファイルを追従するTailFollower（低遅延モードのみ）
+        """
         self.transcriber = transcriber
-        self.processing_files = set()  # 処理中のファイルを追跡
+        self.tail_follower = tail_follower
+        # 書き込み完了の確認は別スレッドで行い、監視スレッドを止めない
+        self.readiness = FileReadinessScheduler(on_ready=self._on_file_ready)
         
     def on_created(self, event):
         """ファイル作成イベントの処理"""
@@ -238,36 +1331,58 @@ class AudioFileHandler(FileSystemEventHandler):
         
         # WAVファイルのみ処理
         if file_path.suffix.lower() == ".wav":
-            # ファイルが完全に書き込まれるまで待機
-            self._wait_for_file_ready(file_path)
-            
-            # 重複処理を防ぐ
-            if file_path not in self.processing_files:
-                self.processing_files.add(file_path)
-                logger.info(f"新しいWAVファイルを検出: {file_path.name}")
-                self.transcriber.add_to_queue(file_path)
+            if self.tail_follower is not None and not wav_is_complete(file_path):
+                self.tail_follower.follow(file_path)
+            # 録音の開始：解放したモデルをファイルの書き込み完了までに読み込んでおく
+            self.transcriber.prewarm()
+            self.readiness.watch(file_path)
     
-    def _wait_for_file_ready(self, file_path, timeout=30):
-        """ファイルが完全に書き込まれるまで待機"""
-        last_size = -1
-        stable_count = 0
-        
-        for _ in range(timeout * 10):  # 0.1秒ごとにチェック
-            try:
-                current_size = file_path.stat().st_size
-                if current_size == last_size and current_size > 0:
-                    stable_count += 1
-                    if stable_count >= 5:  # 0.5秒間サイズが変わらない
-                        return True
-                else:
-                    stable_count = 0
-                    last_size = current_size
-                time.sleep(0.1)
-            except OSError:
-                time.sleep(0.1)
+    def on_closed(self, event):
+        """書き込み後にファイルが閉じられた時の処理（Linuxのinotifyのみ）"""
+        if event.is_directory:
+            return
         
-        logger.warning(f"ファイルの準備完了を待機中にタイムアウト: {file_path.name}")
-        return False
+        file_path = Path(event.src_path)
+        if file_path.suffix.lower() == ".wav":
+            self.readiness.mark_closed(file_path)
+    
+    def _on_file_ready(self, file_path):
+        """書き込みが完了したファイルをキューに追加"""
+        logger.info(f"新しいWAVファイルを検出: {file_path.name}")
+        if self.tail_follower is not None:
+            self.tail_follower.finish(file_path)
+        self.transcriber.add_to_queue(file_path)
+    
+    def stop(self):
+        """書き込み完了の確認・追従を停止"""
+        self.readiness.stop()
+        if self.tail_follower is not None:
+            self.tail_follower.stop()
+
+
+def enqueue_existing_files(transcriber):
+    """未処理の既存WAVファイルを低優先度でキューに追加"""
+    existing_files = list(RECORDINGS_DIR.glob("*.wav"))
+    unprocessed_files = [f for f in existing_files if not transcriber.tracker.is_processed(f)]
+    
+    if not unprocessed_files:
+        logger.info("未処理のファイルはありません")
+        return
+    
+    logger.info(f"{len(unprocessed_files)}個の未処理ファイルを処理します")
+    for wav_file in unprocessed_files:
+        transcriber.add_to_queue(wav_file, priority=PRIORITY_BACKFILL)
+
+
+def write_queue_status(transcriber):
+    """キューの状態をファイルに書き出す"""
+    try:
+        tmp_path = QUEUE_STATUS_PATH.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(transcriber.queue_status(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, QUEUE_STATUS_PATH)
+    except OSError as e:
+        logger.debug(f"キュー状態の書き出しエラー: {e}")
 
 
 def main():
@@ -286,35 +1401,36 @@ def main():
     # Whisperモデルの初期化
     transcriber = AudioTranscriber(model_size=WHISPER_MODEL_SIZE)
     
-    # 既存のWAVファイルを処理（環境変数で制御）
-    if PROCESS_EXISTING_FILES:
-        existing_files = list(RECORDINGS_DIR.glob("*.wav"))
-        unprocessed_files = [f for f in existing_files if not transcriber.tracker.is_processed(f)]
-        
-        if unprocessed_files:
-            logger.info(f"{len(unprocessed_files)}個の未処理ファイルを処理します")
-            for wav_file in unprocessed_files:
-                transcriber.add_to_queue(wav_file)
-        else:
-            logger.info("未処理のファイルはありません")
+    # 低遅延モード：書き込み中のファイルを別のモデルで追いかける
+    tail_follower = None
+    if TAIL_FOLLOW_ENABLED:
+        logger.info(f"低遅延モード: 暫定テキストを{TAIL_FOLLOW_MODEL_SIZE}モデルで書き出します")
+        tail_follower = TailFollower(transcriber._load_model(TAIL_FOLLOW_MODEL_SIZE))
     
     # ファイル監視の設定
-    event_handler = AudioFileHandler(transcriber)
+    event_handler = AudioFileHandler(transcriber, tail_follower=tail_follower)
     observer = Observer()
     observer.schedule(event_handler, str(RECORDINGS_DIR), recursive=False)
     
-    # 監視開始
+    # 監視開始（既存ファイルの追加より先に始め、新しい録音を待たせない）
     observer.start()
     logger.info("ファイル監視を開始しました。終了するにはCtrl+Cを押してください。")
     
+    # 既存のWAVファイルを処理（環境変数で制御）
+    # キューが上限に達すると追加が待たされるため、別スレッドで追加する
+    if PROCESS_EXISTING_FILES:
+        threading.Thread(target=enqueue_existing_files, args=(transcriber,), daemon=True).start()
+    
     try:
         while True:
             time.sleep(1)
+            write_queue_status(transcriber)
     except KeyboardInterrupt:
         logger.info("終了シグナルを受信しました")
     finally:
         observer.stop()
         observer.join()
+        event_handler.stop()
         transcriber.stop()
         logger.info("システムを終了しました")
 
@@ -0,0 +1,115 @@
+"""
+文字起こし結果のキャッシュ
+音声データのハッシュとモデル設定をキーに、文字起こし結果をディスクに保存します。
+容量の上限を超えた場合は、最も長く使われていない結果から削除します（LRU）。
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptCache:
+    """文字起こし結果のLRUキャッシュ"""
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        Args:
+            cache_dir: キャッシュの保存ディレクトリ
+            max_bytes: キャッシュ全体の容量の上限（バイト）
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        # キー -> ファイルサイズ（古く使われたものが先頭）
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+                entries.append((stat.st_mtime, path.stem, stat.st_size))
+            except OSError:
+                continue
+        for _, key, size in sorted(entries):
+            self.entries[key] = size
+            self.total_bytes += size
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content_hash, *settings):
+        """音声データのハッシュと設定値（モデル、言語など）からキーを作る"""
+        digest = hashlib.blake2b(content_hash.encode(), digest_size=16)
+        for value in settings:
+            digest.update(b"\0" + str(value).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key):
+        """キャッシュされた結果を取得（ない場合はNone）"""
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+                os.utime(path)  # 最終使用日時を更新（再起動後のLRU順序に使う）
+            except (OSError, ValueError) as e:
+                logger.warning(f"キャッシュの読み込みエラー ({key}): {e}")
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        """結果をキャッシュに保存"""
+        data = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+
+        with self.lock:
+            path = self._path(key)
+            tmp_path = path.with_suffix(".tmp")
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"キャッシュの保存エラー ({key}): {e}")
+                return
+
+            self.total_bytes += len(data) - self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self._evict()
+
+    def _remove(self, key):
+        """エントリを削除（lockを保持した状態で呼ぶ）"""
+        self.total_bytes -= self.entries.pop(key, 0)
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+    def _evict(self):
+        """容量の上限を超えている間、最も長く使われていない結果を削除"""
+        while self.total_bytes > self.max_bytes and self.entries:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)